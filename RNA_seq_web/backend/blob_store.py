@@ -0,0 +1,186 @@
+"""
+Content-addressed store for uploaded inputs: `python -m backend.blob_store gc`.
+
+Uploads are hashed while streaming to disk and kept once under
+objects/<sha256[:2]>/<sha256>. Jobs get hard links to them (a copy only when
+the job root is on another filesystem), so the link count of an object is its
+reference count and removing a job directory releases its references. The
+binary count matrix converted from a counts blob is cached per blob under
+matrix/ and linked into jobs the same way.
+"""
+
+from __future__ import annotations
+
+import argparse
+import errno
+import hashlib
+import json
+import os
+import shutil
+import stat
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from .config import get_settings
+from .count_matrix import MATRIX_BIN_NAME, MATRIX_INDEX_NAME, convert_counts_table
+
+
+CHUNK_SIZE = 1 << 20
+# Objects younger than this survive gc even when unreferenced (ingested, not yet linked).
+GC_GRACE_SECONDS = 3600
+# Part of cached matrix names; bump when convert_counts_table() output changes.
+MATRIX_CACHE_VERSION = 2
+_READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+
+@dataclass(frozen=True)
+class Blob:
+    digest: str
+    path: Path
+    size: int
+
+
+class BlobStore:
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.objects = root / "objects"
+        self.matrix = root / "matrix"
+        self.tmp = root / "tmp"
+
+    def ensure(self) -> None:
+        for d in (self.objects, self.matrix, self.tmp):
+            d.mkdir(parents=True, exist_ok=True)
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest
+
+    def ingest_file(self, fileobj: BinaryIO) -> Blob:
+        """Stream a file object into the store; an identical upload reuses the existing object."""
+        self.ensure()
+        h = hashlib.sha256()
+        size = 0
+        tmp = self.tmp / f"upload-{uuid.uuid4().hex}"
+        try:
+            with tmp.open("wb") as out:
+                for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                    h.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            digest = h.hexdigest()
+            dst = self.object_path(digest)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            if dst.exists():
+                # Deduplicated: refresh mtime so a concurrent gc keeps it until it is linked.
+                os.utime(dst)
+            else:
+                os.chmod(tmp, _READ_ONLY)
+                os.replace(tmp, dst)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return Blob(digest=digest, path=dst, size=size)
+
+    def link(self, src: Path, dst: Path) -> None:
+        """
+        Reference a stored file from a job directory. Copies only when a hard
+        link is impossible (other filesystem, or no hard-link support);
+        any other error (missing blob, permissions, disk full) is raised.
+        """
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(src, dst)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            shutil.copy2(src, dst)
+
+    @staticmethod
+    def refcount(path: Path) -> int:
+        try:
+            return path.stat().st_nlink - 1
+        except FileNotFoundError:
+            return 0
+
+    def ensure_count_matrix(self, blob: Blob, suffix: str) -> tuple[Path, dict[str, Any]]:
+        """
+        Binary count matrix for a counts blob, converted once per (blob, delimiter).
+        The delimiter follows the upload's extension like read_table_auto() in lib.R.
+        """
+        self.ensure()
+        delimiter = "," if suffix.lower() == ".csv" else "\t"
+        matrix_dir = self.matrix / f"{blob.digest}.{'csv' if delimiter == ',' else 'tsv'}.v{MATRIX_CACHE_VERSION}"
+        index_path = matrix_dir / MATRIX_INDEX_NAME
+        if index_path.exists():
+            os.utime(index_path)
+            return matrix_dir, json.loads(index_path.read_text(encoding="utf-8"))
+
+        work = self.tmp / f"matrix-{uuid.uuid4().hex}"
+        try:
+            index = convert_counts_table(blob.path, work, delimiter=delimiter)
+            for name in (MATRIX_BIN_NAME, MATRIX_INDEX_NAME):
+                os.chmod(work / name, _READ_ONLY)
+            try:
+                os.rename(work, matrix_dir)
+            except OSError:
+                # Converted concurrently by another request; keep the first one.
+                if not index_path.exists():
+                    raise
+        finally:
+            if work.exists():
+                shutil.rmtree(work, ignore_errors=True)
+        return matrix_dir, index
+
+    def gc(self, grace_seconds: int = GC_GRACE_SECONDS) -> dict[str, int]:
+        """Delete objects and cached matrices no job links to any more."""
+        self.ensure()
+        now = time.time()
+        removed_objects = removed_matrices = freed = 0
+        for path in self.objects.glob("*/*"):
+            st = path.stat()
+            if st.st_nlink <= 1 and now - st.st_mtime > grace_seconds:
+                path.unlink(missing_ok=True)
+                removed_objects += 1
+                freed += st.st_size
+        for matrix_dir in self.matrix.iterdir():
+            bin_path = matrix_dir / MATRIX_BIN_NAME
+            index_path = matrix_dir / MATRIX_INDEX_NAME
+            digest = matrix_dir.name.split(".", 1)[0]
+            try:
+                st = bin_path.stat()
+                idle = now - index_path.stat().st_mtime > grace_seconds
+            except FileNotFoundError:
+                st, idle = None, True
+            if idle and (st is None or st.st_nlink <= 1) and not self.object_path(digest).exists():
+                freed += st.st_size if st else 0
+                shutil.rmtree(matrix_dir, ignore_errors=True)
+                removed_matrices += 1
+        for path in self.tmp.iterdir():
+            if now - path.stat().st_mtime > grace_seconds:
+                shutil.rmtree(path, ignore_errors=True) if path.is_dir() else path.unlink(missing_ok=True)
+        return {"objects_removed": removed_objects, "matrices_removed": removed_matrices, "bytes_freed": freed}
+
+    def stats(self) -> dict[str, Any]:
+        objects = [p.stat() for p in self.objects.glob("*/*")] if self.objects.exists() else []
+        return {
+            "root": str(self.root),
+            "objects": len(objects),
+            "bytes": sum(st.st_size for st in objects),
+            "references": sum(st.st_nlink - 1 for st in objects),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="RNA_seq_web input blob store")
+    parser.add_argument("command", choices=("gc", "stats"))
+    parser.add_argument("--grace-seconds", type=int, default=GC_GRACE_SECONDS)
+    args = parser.parse_args()
+
+    store = BlobStore(get_settings().blob_dir)
+    result = store.gc(args.grace_seconds) if args.command == "gc" else store.stats()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,27 @@ class Settings:
     msigdb_dir: Path
     cache_dir: Path
     rscript_path: str
+    gsva_workers: int | None
+    gsva_memory_mb: int | None
+    executor: str
+    spool_dir: Path
+    lease_seconds: int
+    run_timeout_seconds: int
+    index_dir: Path
+    trace_dir: Path
+    trace_sample_rate: float
+    probe_ttl_seconds: int
+    blob_dir: Path
+
+
+def _env_int(name: str) -> int | None:
+    raw = os.environ.get(name, "").strip()
+    return int(raw) if raw else None
+
+
+def _env_float(name: str) -> float | None:
+    raw = os.environ.get(name, "").strip()
+    return float(raw) if raw else None
 
 
 def get_settings() -> Settings:
@@ -22,6 +43,14 @@ def get_settings() -> Settings:
     msigdb_dir = Path(os.environ.get("RNA_SEQ_WEB_MSIGDB_DIR", project_root / "msigdb")).resolve()
     cache_dir = Path(os.environ.get("RNA_SEQ_WEB_CACHE_DIR", project_root / "cache")).resolve()
     rscript_path = os.environ.get("RNA_SEQ_WEB_RSCRIPT", "Rscript")
+    executor = os.environ.get("RNA_SEQ_WEB_EXECUTOR", "local").strip().lower() or "local"
+    if executor not in ("local", "spool"):
+        raise ValueError(f"RNA_SEQ_WEB_EXECUTOR must be local or spool, got: {executor}")
+    spool_dir = Path(os.environ.get("RNA_SEQ_WEB_SPOOL_DIR", jobs_root.parent / "spool")).resolve()
+    index_dir = Path(os.environ.get("RNA_SEQ_WEB_INDEX_DIR", jobs_root.parent / "index")).resolve()
+    trace_dir = Path(os.environ.get("RNA_SEQ_WEB_TRACE_DIR", jobs_root.parent / "traces")).resolve()
+    blob_dir = Path(os.environ.get("RNA_SEQ_WEB_BLOB_DIR", jobs_root.parent / "blobs")).resolve()
+    trace_sample_rate = _env_float("RNA_SEQ_WEB_TRACE_SAMPLE")
 
     return Settings(
         project_root=project_root,
@@ -30,5 +59,16 @@ def get_settings() -> Settings:
         msigdb_dir=msigdb_dir,
         cache_dir=cache_dir,
         rscript_path=rscript_path,
+        gsva_workers=_env_int("RNA_SEQ_WEB_GSVA_WORKERS"),
+        gsva_memory_mb=_env_int("RNA_SEQ_WEB_GSVA_MEMORY_MB"),
+        executor=executor,
+        spool_dir=spool_dir,
+        lease_seconds=_env_int("RNA_SEQ_WEB_LEASE_SECONDS") or 60,
+        run_timeout_seconds=_env_int("RNA_SEQ_WEB_RUN_TIMEOUT") or 3600,
+        index_dir=index_dir,
+        trace_dir=trace_dir,
+        trace_sample_rate=0.1 if trace_sample_rate is None else trace_sample_rate,
+        probe_ttl_seconds=_env_int("RNA_SEQ_WEB_PROBE_TTL") or 600,
+        blob_dir=blob_dir,
     )
 
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import csv
+import json
+import math
+import os
+import sys
+from array import array
+from pathlib import Path
+from typing import Any
+
+
+MATRIX_BIN_NAME = "counts_matrix.bin"
+MATRIX_INDEX_NAME = "counts_matrix.json"
+
+_NA_TOKENS = frozenset(("", "NA", "NaN", "nan", "NULL", "null"))
+_INT32_MAX = 2**31 - 1
+
+
+def _delimiter_for(path: Path) -> str:
+    # Same rule as read_table_auto() in analysis/lib.R: .csv is comma, anything else is tab.
+    return "," if path.suffix.lower() == ".csv" else "\t"
+
+
+def _parse_count(token: str) -> int:
+    token = token.strip()
+    if token in _NA_TOKENS:
+        return 0
+    value = float(token)
+    if not math.isfinite(value):
+        raise ValueError(f"non-finite count: {token}")
+    if value < 0:
+        raise ValueError(f"negative count: {token}")
+    return int(round(value))
+
+
+def convert_counts_table(src: Path, dst_dir: Path, delimiter: str | None = None) -> dict[str, Any]:
+    """
+    Convert an uploaded counts table (first column gene, remaining columns samples)
+    into a compact binary matrix next to it:
+
+    - counts_matrix.bin: little-endian int32, row-major (gene x sample)
+    - counts_matrix.json: shape, gene/sample index and conversion stats
+
+    Duplicate gene symbols are collapsed by summing their rows (each group once,
+    column-wise in C after the file is read), so the R side never has to merge
+    them again. Non-integer counts are rounded
+    (DESeq2 rounds them anyway), empty/NA cells count as 0. The delimiter follows
+    src's extension unless given (blob store objects have no extension).
+    """
+    dst_dir.mkdir(parents=True, exist_ok=True)
+    rows: list[array] = []
+    row_of_gene: dict[str, int] = {}
+    genes: list[str] = []
+    # row index -> later rows of the same gene, summed once at the end
+    duplicates: dict[int, list[array]] = {}
+    n_input_rows = 0
+
+    with src.open("r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f, delimiter=delimiter or _delimiter_for(src))
+        header = next(reader, None)
+        if header is None or len(header) < 2:
+            raise ValueError("counts 列数不足：需要第一列 gene + 至少 1 个样本列")
+        samples = list(header[1:])
+        n_samples = len(samples)
+
+        for lineno, rec in enumerate(reader, start=2):
+            if not rec or (len(rec) == 1 and not rec[0].strip()):
+                continue
+            if len(rec) != n_samples + 1:
+                raise ValueError(f"counts 第 {lineno} 行列数为 {len(rec)}，表头为 {n_samples + 1}")
+            try:
+                values = array("q", map(_parse_count, rec[1:]))
+            except ValueError:
+                # Slow path only to name the offending column.
+                for j, tok in enumerate(rec[1:]):
+                    try:
+                        _parse_count(tok)
+                    except ValueError as e:
+                        raise ValueError(f"counts 第 {lineno} 行第 {j + 2} 列（{samples[j]}）无法解析为计数: {e}") from None
+                raise
+            n_input_rows += 1
+
+            # Identifiers stay byte-identical to what read.csv() gives R on the CSV path.
+            gene = rec[0]
+            idx = row_of_gene.get(gene)
+            if idx is None:
+                row_of_gene[gene] = len(rows)
+                genes.append(gene)
+                rows.append(values)
+            else:
+                duplicates.setdefault(idx, []).append(values)
+
+    if not rows:
+        raise ValueError("counts 文件没有数据行")
+    for idx, extra in duplicates.items():
+        rows[idx] = array("q", map(sum, zip(rows[idx], *extra)))
+
+    bin_path = dst_dir / MATRIX_BIN_NAME
+    tmp_bin = bin_path.with_suffix(".bin.tmp")
+    with tmp_bin.open("wb") as f:
+        for values in rows:
+            if max(values) > _INT32_MAX:
+                raise ValueError("counts 超出 int32 范围")
+            out = array("i", values)
+            if sys.byteorder != "little":
+                out.byteswap()
+            out.tofile(f)
+    os.replace(tmp_bin, bin_path)
+
+    index = {
+        "format": "int32-le",
+        "layout": "row-major",
+        "n_genes": len(genes),
+        "n_samples": n_samples,
+        "genes": genes,
+        "samples": samples,
+        "source": src.name,
+        "input_rows": n_input_rows,
+        "duplicates_merged": n_input_rows - len(genes),
+    }
+    index_path = dst_dir / MATRIX_INDEX_NAME
+    tmp_index = index_path.with_suffix(".json.tmp")
+    tmp_index.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_index, index_path)
+    return index
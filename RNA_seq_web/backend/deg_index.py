@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import csv
+import fcntl
+import json
+import os
+import threading
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Literal
+
+
+DEG_SETS_NAME = "deg_sets.json"
+DEG_FILTERED_NAME = "deg_filtered.csv"
+DEG_SUMMARY_NAME = "deg_summary.json"
+GENE_INDEX_NAME = "genes.txt"
+MAX_COMPARE_JOBS = 64
+
+Direction = Literal["up", "down", "all"]
+
+
+class GeneIndex:
+    """
+    Global, append-only gene symbol -> integer id table shared by all jobs
+    (one symbol per line; the id is the line number). The header line holds a
+    generation id so per-job summaries built against a deleted/recreated index
+    are detected and rebuilt. Appends take an exclusive flock, so several API
+    processes on the same filesystem can extend the index concurrently.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.generation = ""
+        self._ids: dict[str, int] = {}
+        self._symbols: list[str] = []
+        self._offset = 0
+        self._inode = 0
+        self._lock = threading.Lock()
+
+    def _reset(self) -> None:
+        self.generation = ""
+        self._ids = {}
+        self._symbols = []
+        self._offset = 0
+        self._inode = 0
+
+    def _refresh(self) -> None:
+        # Only read what other processes appended since the last refresh; start
+        # over when the file was deleted, replaced (new inode) or truncated.
+        try:
+            with self.path.open("rb") as f:
+                st = os.fstat(f.fileno())
+                if st.st_ino != self._inode or st.st_size < self._offset:
+                    self._reset()
+                    self._inode = st.st_ino
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            self._reset()
+            return
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return
+        lines = data[:end].decode("utf-8").splitlines()
+        if self._offset == 0:
+            self.generation = lines.pop(0).removeprefix("# gene-index ").strip()
+        for symbol in lines:
+            self._ids[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+        self._offset += end
+
+    def ids_for(self, symbols: list[str]) -> list[int]:
+        with self._lock:
+            self._refresh()
+            missing = [s for s in dict.fromkeys(symbols) if s not in self._ids]
+            if missing:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with self.path.open("ab") as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    try:
+                        self._refresh()
+                        if f.tell() == 0:
+                            f.write(f"# gene-index {uuid.uuid4().hex}\n".encode("utf-8"))
+                        new = [s for s in missing if s not in self._ids]
+                        if new:
+                            f.write("".join(f"{s}\n" for s in new).encode("utf-8"))
+                        f.flush()
+                        self._refresh()
+                    finally:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+            return [self._ids[s] for s in symbols]
+
+    def current_generation(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self.generation
+
+    def symbols_for(self, ids: list[int]) -> list[str]:
+        with self._lock:
+            if ids and max(ids) >= len(self._symbols):
+                self._refresh()
+            return [self._symbols[i] for i in ids]
+
+
+_gene_indexes: dict[str, GeneIndex] = {}
+_gene_indexes_lock = threading.Lock()
+
+
+def get_gene_index(index_dir: Path) -> GeneIndex:
+    path = index_dir / GENE_INDEX_NAME
+    with _gene_indexes_lock:
+        index = _gene_indexes.get(str(path))
+        if index is None:
+            index = _gene_indexes[str(path)] = GeneIndex(path)
+        return index
+
+
+def _read_deg_sets(job_dir: Path) -> dict[str, Any] | None:
+    out_dir = job_dir / "output"
+    sets_path = out_dir / DEG_SETS_NAME
+    if sets_path.is_file():
+        return json.loads(sets_path.read_text(encoding="utf-8"))
+
+    # Jobs finished before deg_sets.json existed: derive once from deg_filtered.csv.
+    filtered_path = out_dir / DEG_FILTERED_NAME
+    if not filtered_path.is_file():
+        return None
+    up: list[str] = []
+    down: list[str] = []
+    with filtered_path.open("r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                lfc = float(row.get("log2FoldChange") or "nan")
+            except ValueError:
+                continue
+            gene = (row.get("gene") or "").strip()
+            if gene and lfc > 0:
+                up.append(gene)
+            elif gene and lfc < 0:
+                down.append(gene)
+    params: dict[str, Any] = {}
+    try:
+        params = json.loads((job_dir / "params.json").read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        pass
+    return {
+        "padj_threshold": params.get("padj_threshold"),
+        "lfc_threshold": params.get("lfc_threshold"),
+        "n_tested": None,
+        "up": list(dict.fromkeys(up)),
+        "down": list(dict.fromkeys(down)),
+    }
+
+
+def _summary_path(job_dir: Path) -> Path:
+    return job_dir / "cache" / DEG_SUMMARY_NAME
+
+
+def _source_signature(job_dir: Path) -> tuple[str, int] | None:
+    for name in (DEG_SETS_NAME, DEG_FILTERED_NAME):
+        try:
+            return name, (job_dir / "output" / name).stat().st_mtime_ns
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def _read_summary(job_dir: Path) -> dict[str, Any] | None:
+    try:
+        data = json.loads(_summary_path(job_dir).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def deg_summary_stale(job_dir: Path, index: GeneIndex) -> bool:
+    """True when DEG sets exist but cache/deg_summary.json is missing or out of date."""
+    sig = _source_signature(job_dir)
+    if sig is None:
+        return False
+    summary = _read_summary(job_dir)
+    if summary is None:
+        return True
+    return (
+        summary.get("source") != sig[0]
+        or summary.get("source_mtime_ns") != sig[1]
+        or summary.get("gene_index") != index.current_generation()
+    )
+
+
+def build_deg_summary(job_dir: Path, index: GeneIndex) -> dict[str, Any] | None:
+    """Map a job's up/down DEG symbols to global gene ids and persist them as sorted arrays."""
+    sig = _source_signature(job_dir)
+    sets = _read_deg_sets(job_dir)
+    if sig is None or sets is None:
+        return None
+    up = [str(g) for g in sets.get("up") or []]
+    down = [str(g) for g in sets.get("down") or []]
+    ids = index.ids_for(up + down)
+    summary = {
+        "source": sig[0],
+        "source_mtime_ns": sig[1],
+        "gene_index": index.generation,
+        "padj_threshold": sets.get("padj_threshold"),
+        "lfc_threshold": sets.get("lfc_threshold"),
+        "n_tested": sets.get("n_tested"),
+        "up": sorted(set(ids[: len(up)])),
+        "down": sorted(set(ids[len(up):])),
+    }
+    path = _summary_path(job_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    tmp.write_text(json.dumps(summary), encoding="utf-8")
+    os.replace(tmp, path)
+    return summary
+
+
+def ensure_deg_summary(job_dir: Path, index: GeneIndex) -> None:
+    if deg_summary_stale(job_dir, index):
+        build_deg_summary(job_dir, index)
+
+
+def _to_bitset(ids: list[int]) -> int:
+    if not ids:
+        return 0
+    buf = bytearray(ids[-1] // 8 + 1)
+    for i in ids:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def _from_bitset(bits: int, limit: int) -> list[int]:
+    out: list[int] = []
+    while bits and len(out) < limit:
+        low = bits & -bits
+        out.append(low.bit_length() - 1)
+        bits ^= low
+    return out
+
+
+@lru_cache(maxsize=256)
+def _load_bitsets(summary_path: str, mtime_ns: int) -> tuple[dict[str, Any], int, int]:
+    summary = json.loads(Path(summary_path).read_text(encoding="utf-8"))
+    return summary, _to_bitset(summary.get("up") or []), _to_bitset(summary.get("down") or [])
+
+
+def load_deg_bitsets(job_dir: Path, index: GeneIndex) -> tuple[dict[str, Any], int, int] | None:
+    """(summary, up bitset, down bitset) for one job; builds the summary on first use."""
+    ensure_deg_summary(job_dir, index)
+    path = _summary_path(job_dir)
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _load_bitsets(str(path), mtime_ns)
+
+
+def compare_deg_sets(
+    jobs: list[tuple[str, dict[str, Any], int, int]],
+    index: GeneIndex,
+    *,
+    direction: Direction = "all",
+    max_genes: int = 200,
+) -> dict[str, Any]:
+    """
+    Pairwise overlap counts, Jaccard indexes and shared genes across jobs.
+    `jobs` holds (job_id, summary, up bitset, down bitset) as returned by
+    load_deg_bitsets(). For direction "all" a gene shared between two jobs may
+    change in opposite directions; those are counted as "discordant".
+    """
+    def pick(up: int, down: int) -> int:
+        if direction == "up":
+            return up
+        if direction == "down":
+            return down
+        return up | down
+
+    sets = [pick(up, down) for _, _, up, down in jobs]
+    sizes = [s.bit_count() for s in sets]
+    n = len(jobs)
+    overlap = [[0] * n for _ in range(n)]
+    jaccard = [[0.0] * n for _ in range(n)]
+    pairs: list[dict[str, Any]] = []
+    for i in range(n):
+        overlap[i][i] = sizes[i]
+        jaccard[i][i] = 1.0 if sizes[i] else 0.0
+        for j in range(i + 1, n):
+            shared = sets[i] & sets[j]
+            k = shared.bit_count()
+            union = sizes[i] + sizes[j] - k
+            jac = round(k / union, 4) if union else 0.0
+            overlap[i][j] = overlap[j][i] = k
+            jaccard[i][j] = jaccard[j][i] = jac
+            _, _, up_i, down_i = jobs[i]
+            _, _, up_j, down_j = jobs[j]
+            pairs.append(
+                {
+                    "a": jobs[i][0],
+                    "b": jobs[j][0],
+                    "shared": k,
+                    "jaccard": jac,
+                    "discordant": ((up_i & down_j) | (down_i & up_j)).bit_count() if direction == "all" else 0,
+                    "genes": index.symbols_for(_from_bitset(shared, max_genes)),
+                    "truncated": k > max_genes,
+                }
+            )
+
+    common = sets[0] if sets else 0
+    for s in sets[1:]:
+        common &= s
+    common_count = common.bit_count()
+
+    return {
+        "direction": direction,
+        "jobs": [
+            {
+                "job_id": job_id,
+                "n_genes": sizes[i],
+                "n_up": up.bit_count(),
+                "n_down": down.bit_count(),
+                "padj_threshold": summary.get("padj_threshold"),
+                "lfc_threshold": summary.get("lfc_threshold"),
+            }
+            for i, (job_id, summary, up, down) in enumerate(jobs)
+        ],
+        "overlap": overlap,
+        "jaccard": jaccard,
+        "pairs": pairs,
+        "shared_all": {
+            "count": common_count,
+            "genes": index.symbols_for(_from_bitset(common, max_genes)),
+            "truncated": common_count > max_genes,
+        },
+    }
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import socket
+import subprocess
+import time
+import uuid
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import Any, Protocol
+
+from .config import Settings
+
+
+WORKER_ID_ENV = "RNA_SEQ_WEB_WORKER_ID"
+
+
+@dataclass(frozen=True)
+class RTask:
+    """One Rscript invocation: `rscript analysis_script --job_dir <job_dir> --params <params_path>`."""
+
+    task_id: str
+    rscript: str
+    analysis_script: str
+    job_dir: str
+    params_path: str
+    log_path: str
+    submitted_at: float
+    # Only run-and-wait callers need a done/ record; fire-and-forget jobs report via status.json.
+    notify_done: bool = False
+    # Incremented each time an expired claim is re-queued; part of the claim token.
+    attempt: int = 0
+
+    @classmethod
+    def new(cls, *, rscript: str, analysis_script: Path, job_dir: Path, params_path: Path, log_path: Path) -> RTask:
+        # Time prefix keeps the spool queue FIFO when listed by name.
+        return cls(
+            task_id=f"{time.time_ns():020d}-{uuid.uuid4().hex[:12]}",
+            rscript=rscript,
+            analysis_script=str(analysis_script),
+            job_dir=str(job_dir),
+            params_path=str(params_path),
+            log_path=str(log_path),
+            submitted_at=time.time(),
+        )
+
+    def command(self, *, rscript: str | None = None, analysis_script: str | None = None) -> list[str]:
+        return [
+            rscript or self.rscript,
+            analysis_script or self.analysis_script,
+            "--job_dir",
+            self.job_dir,
+            "--params",
+            self.params_path,
+        ]
+
+
+class Executor(Protocol):
+    def submit(self, task: RTask) -> None:
+        """Start the task and return immediately."""
+
+    def run(self, task: RTask) -> int:
+        """Run the task to completion and return the Rscript exit code."""
+
+
+def local_worker_id() -> str:
+    return f"local@{socket.gethostname()}"
+
+
+def _child_env(worker_id: str) -> dict[str, str]:
+    env = dict(os.environ)
+    env[WORKER_ID_ENV] = worker_id
+    return env
+
+
+class LocalExecutor:
+    """Default single-host executor: Rscript runs as a child of the API process."""
+
+    def __init__(self) -> None:
+        self.worker_id = local_worker_id()
+
+    def submit(self, task: RTask) -> None:
+        log_path = Path(task.log_path)
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        log_f = log_path.open("ab", buffering=0)
+        try:
+            subprocess.Popen(
+                task.command(),
+                stdout=log_f,
+                stderr=subprocess.STDOUT,
+                cwd=task.job_dir,
+                close_fds=True,
+                env=_child_env(self.worker_id),
+            )
+        finally:
+            # Child inherits the fd; we can close our reference.
+            try:
+                log_f.close()
+            except Exception:
+                pass
+
+    def run(self, task: RTask) -> int:
+        log_path = Path(task.log_path)
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        with log_path.open("ab", buffering=0) as log_f:
+            proc = subprocess.run(
+                task.command(),
+                stdout=log_f,
+                stderr=subprocess.STDOUT,
+                cwd=task.job_dir,
+                close_fds=True,
+                env=_child_env(self.worker_id),
+            )
+            return int(proc.returncode)
+
+
+@dataclass(frozen=True)
+class SpoolDirs:
+    """
+    Shared-filesystem work queue. A task moves queue/<task_id>.json ->
+    claimed/<task_id>@<token>.json (atomic rename = claim) and finishes with a
+    record in done/. The token (attempt + worker id) makes every claim's files
+    distinct, so a worker only ever heartbeats, completes or deletes its own
+    claim. leases/ holds the claiming worker's heartbeat under the same name;
+    claimed tasks whose lease expires are moved back to queue/ by any worker.
+    """
+
+    root: Path
+
+    @property
+    def queue(self) -> Path:
+        return self.root / "queue"
+
+    @property
+    def claimed(self) -> Path:
+        return self.root / "claimed"
+
+    @property
+    def leases(self) -> Path:
+        return self.root / "leases"
+
+    @property
+    def done(self) -> Path:
+        return self.root / "done"
+
+    def ensure(self) -> None:
+        for d in (self.queue, self.claimed, self.leases, self.done):
+            d.mkdir(parents=True, exist_ok=True)
+
+    def claim_path(self, task_id: str, worker_id: str, attempt: int) -> Path:
+        token = f"{attempt}-{re.sub(r'[^A-Za-z0-9_.-]', '_', worker_id)}"
+        return self.claimed / f"{task_id}@{token}.json"
+
+    def claims_of(self, task_id: str) -> list[Path]:
+        return sorted(self.claimed.glob(f"{task_id}@*.json"))
+
+
+def claim_task_id(claimed: Path) -> str:
+    return claimed.stem.split("@", 1)[0]
+
+
+def write_json_atomic(path: Path, payload: dict[str, Any]) -> None:
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+# Exit code reported by SpoolExecutor.run when no worker finished the task in time.
+TIMEOUT_RETURNCODE = 124
+
+
+class SpoolExecutor:
+    """Enqueue tasks for `python -m backend.worker` daemons on any node sharing the spool and var/jobs."""
+
+    def __init__(self, spool_dir: Path, poll_seconds: float = 1.0, *, lease_seconds: int = 60, timeout_seconds: int = 3600) -> None:
+        self.dirs = SpoolDirs(spool_dir)
+        self.dirs.ensure()
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.timeout_seconds = timeout_seconds
+
+    def submit(self, task: RTask) -> None:
+        write_json_atomic(self.dirs.queue / f"{task.task_id}.json", asdict(task))
+
+    def _workers_dead(self, task_id: str) -> bool:
+        """
+        Claimed, but its lease has not been renewed for several lease periods:
+        live workers would have re-queued it after one, so none is serving the spool.
+        """
+        now = time.time()
+        claims = self.dirs.claims_of(task_id)
+        for claimed in claims:
+            try:
+                lease = json.loads((self.dirs.leases / claimed.name).read_text(encoding="utf-8"))
+                last = float(lease.get("heartbeat_at", 0))
+            except (FileNotFoundError, ValueError):
+                try:
+                    last = claimed.stat().st_mtime
+                except FileNotFoundError:
+                    return False  # just finished or re-queued
+            if now - last <= 3 * self.lease_seconds:
+                return False
+        return bool(claims)
+
+    def _abandon(self, task: RTask, reason: str) -> int:
+        # Withdraw the task (queued or claimed) so it cannot run after the caller gave up;
+        # a worker that still runs it sees its claim gone and stops.
+        (self.dirs.queue / f"{task.task_id}.json").unlink(missing_ok=True)
+        for claimed in self.dirs.claims_of(task.task_id):
+            claimed.unlink(missing_ok=True)
+            (self.dirs.leases / claimed.name).unlink(missing_ok=True)
+        try:
+            with Path(task.log_path).open("a", encoding="utf-8") as f:
+                f.write(f"[spool] task {task.task_id} failed: {reason}\n")
+        except OSError:
+            pass
+        return TIMEOUT_RETURNCODE
+
+    def run(self, task: RTask) -> int:
+        self.submit(replace(task, notify_done=True))
+        done_path = self.dirs.done / f"{task.task_id}.json"
+        deadline = time.time() + self.timeout_seconds
+        while True:
+            try:
+                record = json.loads(done_path.read_text(encoding="utf-8"))
+            except (FileNotFoundError, ValueError):
+                if time.time() > deadline:
+                    return self._abandon(task, f"no worker finished it within {self.timeout_seconds}s")
+                if self._workers_dead(task.task_id):
+                    return self._abandon(task, "claiming worker stopped heartbeating and no worker re-queued it")
+                time.sleep(self.poll_seconds)
+                continue
+            done_path.unlink(missing_ok=True)
+            return int(record.get("returncode", 1))
+
+
+def get_executor(settings: Settings) -> Executor:
+    if settings.executor == "spool":
+        return SpoolExecutor(settings.spool_dir, lease_seconds=settings.lease_seconds, timeout_seconds=settings.run_timeout_seconds)
+    return LocalExecutor()
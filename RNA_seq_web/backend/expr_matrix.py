@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import json
+import mmap
+import sys
+from array import array
+from functools import lru_cache
+from pathlib import Path
+
+
+EXPR_CACHE_DIRNAME = "cache"
+EXPR_BIN_NAME = "expr_matrix.bin"
+EXPR_INDEX_NAME = "expr_matrix.json"
+
+
+class ExprMatrix:
+    """
+    Read-only view over the job's cached expression matrix (written by
+    write_expr_matrix_cache() in analysis/lib.R): float64 little-endian,
+    row-major gene x sample, memory-mapped so single genes can be read
+    without loading the whole matrix.
+    """
+
+    def __init__(self, index_path: Path) -> None:
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+        if index.get("format") != "float64-le" or index.get("layout") != "row-major":
+            raise ValueError(f"unsupported expression matrix format: {index.get('format')}/{index.get('layout')}")
+        self.genes: list[str] = list(index["genes"])
+        self.samples: list[str] = list(index["samples"])
+        self.kind: str = str(index.get("kind", ""))
+        self.row_of_gene: dict[str, int] = {}
+        for i, g in enumerate(self.genes):
+            self.row_of_gene.setdefault(g, i)
+
+        bin_path = index_path.with_name(EXPR_BIN_NAME)
+        expected = len(self.genes) * len(self.samples) * 8
+        with bin_path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if expected else None
+        if self._mm is not None and len(self._mm) != expected:
+            raise ValueError(f"{bin_path.name} size mismatch: {len(self._mm)} != {expected}")
+
+    def row(self, gene: str) -> array | None:
+        i = self.row_of_gene.get(gene)
+        if i is None or self._mm is None:
+            return None
+        width = len(self.samples) * 8
+        out = array("d")
+        out.frombytes(self._mm[i * width:(i + 1) * width])
+        if sys.byteorder != "little":
+            out.byteswap()
+        return out
+
+
+@lru_cache(maxsize=8)
+def _open_matrix(index_path: str, mtime_ns: int) -> ExprMatrix:
+    return ExprMatrix(Path(index_path))
+
+
+def load_expr_matrix(job_dir: Path) -> ExprMatrix | None:
+    index_path = job_dir / EXPR_CACHE_DIRNAME / EXPR_INDEX_NAME
+    try:
+        mtime_ns = index_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _open_matrix(str(index_path), mtime_ns)
+
+
+def expr_matrix_signature(job_dir: Path) -> tuple[str, int] | None:
+    index_path = job_dir / EXPR_CACHE_DIRNAME / EXPR_INDEX_NAME
+    try:
+        return str(index_path), index_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
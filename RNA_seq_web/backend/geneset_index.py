@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+
+MAX_SEARCH_LIMIT = 200
+# Shortest symbol prefix accepted before a trailing * (a bare * would match every set).
+MIN_GENE_PREFIX = 2
+_TOKEN_SPLIT_RE = re.compile(r"[^0-9a-z]+")
+
+
+def name_tokens(name: str) -> list[str]:
+    """HALLMARK_TNFA_SIGNALING_VIA_NFKB -> ["hallmark", "tnfa", "signaling", "via", "nfkb"]."""
+    return [t for t in _TOKEN_SPLIT_RE.split(name.lower()) if t]
+
+
+def _prefix_range(keys: list[str], prefix: str) -> range:
+    lo = bisect_left(keys, prefix)
+    hi = bisect_left(keys, prefix + "\uffff", lo)
+    return range(lo, hi)
+
+
+@dataclass(frozen=True)
+class GenesetIndex:
+    """
+    Inverted index over every GMT of one species: gene symbol -> set ids and
+    name token -> set ids, plus sorted key lists for prefix lookups by bisect.
+    Set id lists are compact unsigned-int arrays.
+    """
+
+    signature: tuple[tuple[str, int, int], ...]
+    names: list[str]
+    files: list[str]
+    sizes: array
+    rank: array
+    genes: dict[str, array]
+    gene_keys: list[str]
+    tokens: dict[str, array]
+    token_keys: list[str]
+
+    @classmethod
+    def build(cls, gmt_paths: list[Path], signature: tuple[tuple[str, int, int], ...]) -> GenesetIndex:
+        names: list[str] = []
+        files: list[str] = []
+        sizes = array("I")
+        genes: dict[str, array] = {}
+        tokens: dict[str, array] = {}
+        for path in gmt_paths:
+            with path.open("r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    parts = line.rstrip("\r\n").split("\t")
+                    if len(parts) < 3 or not parts[0]:
+                        continue
+                    set_id = len(names)
+                    names.append(parts[0])
+                    files.append(path.name)
+                    members = {g.upper() for g in parts[2:] if g}
+                    sizes.append(len(members))
+                    for g in members:
+                        ids = genes.get(g)
+                        if ids is None:
+                            ids = genes[g] = array("I")
+                        ids.append(set_id)
+                    for t in set(name_tokens(parts[0])):
+                        ids = tokens.get(t)
+                        if ids is None:
+                            ids = tokens[t] = array("I")
+                        ids.append(set_id)
+        # Position of each set in (name, file) order, so result pages sort on ints.
+        rank = array("I", bytes(4 * len(names)))
+        for pos, set_id in enumerate(sorted(range(len(names)), key=lambda i: (names[i], files[i]))):
+            rank[set_id] = pos
+        return cls(
+            signature=signature,
+            names=names,
+            files=files,
+            sizes=sizes,
+            rank=rank,
+            genes=genes,
+            gene_keys=sorted(genes),
+            tokens=tokens,
+            token_keys=sorted(tokens),
+        )
+
+    def sets_for_gene(self, gene: str) -> set[int]:
+        """
+        Exact symbol match (case-insensitive); a trailing * matches symbols by
+        prefix of at least MIN_GENE_PREFIX characters (ValueError otherwise).
+        """
+        gene = gene.strip().upper()
+        if gene.endswith("*"):
+            prefix = gene.rstrip("*")
+            if len(prefix) < MIN_GENE_PREFIX:
+                raise ValueError(f"gene prefix before * must have at least {MIN_GENE_PREFIX} characters")
+            out: set[int] = set()
+            for i in _prefix_range(self.gene_keys, prefix):
+                out.update(self.genes[self.gene_keys[i]])
+            return out
+        return set(self.genes.get(gene, ()))
+
+    def sets_for_query(self, query: str) -> set[int]:
+        """Every query token must prefix-match some token of the set name."""
+        result: set[int] | None = None
+        for token in name_tokens(query):
+            matched: set[int] = set()
+            for i in _prefix_range(self.token_keys, token):
+                matched.update(self.tokens[self.token_keys[i]])
+            result = matched if result is None else result & matched
+            if not result:
+                return set()
+        return result or set()
+
+    def search(self, *, gene: str = "", query: str = "", offset: int = 0, limit: int = 50) -> dict[str, Any]:
+        hits: set[int] | None = None
+        if gene.strip():
+            hits = self.sets_for_gene(gene)
+        if query.strip():
+            q_hits = self.sets_for_query(query)
+            hits = q_hits if hits is None else hits & q_hits
+        ordered = sorted(hits or (), key=self.rank.__getitem__)
+        page = ordered[offset: offset + limit]
+        return {
+            "total": len(ordered),
+            "offset": offset,
+            "limit": limit,
+            "items": [{"name": self.names[i], "file": self.files[i], "n_genes": self.sizes[i]} for i in page],
+        }
+
+
+_indexes: dict[str, GenesetIndex] = {}
+_build_locks: dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _gmt_signature(dir_path: Path) -> tuple[list[Path], tuple[tuple[str, int, int], ...]]:
+    paths = sorted(p for p in dir_path.glob("*.gmt") if p.is_file())
+    sig = []
+    for p in paths:
+        st = p.stat()
+        sig.append((p.name, st.st_size, st.st_mtime_ns))
+    return paths, tuple(sig)
+
+
+def get_geneset_index(msigdb_dir: Path, species: str) -> GenesetIndex:
+    """
+    Index for msigdb_dir/<species>/*.gmt, rebuilt when any GMT is added, removed
+    or modified (checked by stat on every call; the build itself runs once).
+    """
+    dir_path = msigdb_dir / species
+    if not dir_path.is_dir():
+        raise FileNotFoundError(str(dir_path))
+    paths, sig = _gmt_signature(dir_path)
+    key = str(dir_path)
+    index = _indexes.get(key)
+    if index is not None and index.signature == sig:
+        return index
+    with _locks_guard:
+        lock = _build_locks.setdefault(key, threading.Lock())
+    with lock:
+        index = _indexes.get(key)
+        if index is None or index.signature != sig:
+            index = _indexes[key] = GenesetIndex.build(paths, sig)
+        return index
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import json
+import math
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from .expr_matrix import ExprMatrix, expr_matrix_signature, load_expr_matrix
+
+
+GSEA_CORE_NAME = "gsea_core_genes.json"
+
+
+class HeatmapDataError(ValueError):
+    """Raised when a pathway heatmap cannot be assembled (maps to HTTP 400/404)."""
+
+
+@lru_cache(maxsize=8)
+def _load_core_genes(path_str: str, mtime_ns: int) -> list[dict[str, Any]]:
+    data = json.loads(Path(path_str).read_text(encoding="utf-8"))
+    return data if isinstance(data, list) else []
+
+
+def _find_pathway(rows: list[dict[str, Any]], pathway_id: str, pathway_description: str) -> dict[str, Any] | None:
+    # Same matching order as plot_heatmap_inplace.R: ID first, then Description.
+    if pathway_id:
+        for r in rows:
+            if r.get("ID") == pathway_id:
+                return r
+    if pathway_description:
+        for r in rows:
+            if r.get("Description") == pathway_description:
+                return r
+    return None
+
+
+def zscore_rows(rows: list[list[float]]) -> list[list[float]]:
+    """Row-wise z-score like zscore_matrix() in lib.R; NaN/Inf (zero variance) become 0."""
+    out: list[list[float]] = []
+    for values in rows:
+        n = len(values)
+        mean = sum(values) / n if n else 0.0
+        var = sum((v - mean) ** 2 for v in values) / (n - 1) if n > 1 else 0.0
+        sd = math.sqrt(var)
+        if sd > 0 and math.isfinite(sd):
+            out.append([(v - mean) / sd for v in values])
+        else:
+            out.append([0.0] * n)
+    return out
+
+
+def cluster_order(vectors: list[list[float]]) -> list[int]:
+    """
+    Leaf order of a complete-linkage hierarchical clustering on euclidean
+    distance (the ComplexHeatmap defaults), using the nearest-neighbour chain
+    algorithm so the merge loop stays O(n^2).
+    """
+    n = len(vectors)
+    if n <= 2:
+        return list(range(n))
+
+    dist = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        vi = vectors[i]
+        row = dist[i]
+        for j in range(i + 1, n):
+            d = math.dist(vi, vectors[j])
+            row[j] = d
+            dist[j][i] = d
+
+    tree: list[Any] = list(range(n))
+    active = set(range(n))
+    chain: list[int] = []
+    while len(active) > 1:
+        if not chain:
+            chain.append(min(active))
+        a = chain[-1]
+        prev = chain[-2] if len(chain) > 1 else -1
+        row = dist[a]
+        best = prev
+        best_d = row[prev] if prev >= 0 else math.inf
+        for k in active:
+            if k != a and row[k] < best_d:
+                best, best_d = k, row[k]
+        if best != prev:
+            chain.append(best)
+            continue
+
+        # a and prev are reciprocal nearest neighbours: merge prev into a
+        chain.pop()
+        chain.pop()
+        active.discard(prev)
+        other = dist[prev]
+        for k in active:
+            if k != a:
+                d = max(row[k], other[k])
+                row[k] = d
+                dist[k][a] = d
+        tree[a] = (tree[a], tree[prev])
+
+    order: list[int] = []
+    stack = [tree[active.pop()]]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, tuple):
+            stack.append(node[1])
+            stack.append(node[0])
+        else:
+            order.append(node)
+    return order
+
+
+def _build(matrix: ExprMatrix, pathway: dict[str, Any]) -> dict[str, Any]:
+    core_genes = [str(g) for g in (pathway.get("core_genes") or [])]
+    seen: set[str] = set()
+    genes: list[str] = []
+    raw: list[list[float]] = []
+    for g in core_genes:
+        if g in seen:
+            continue
+        seen.add(g)
+        values = matrix.row(g)
+        if values is not None:
+            genes.append(g)
+            raw.append(list(values))
+    if len(genes) < 2:
+        raise HeatmapDataError(
+            f"匹配的基因数不足 2 个（core genes 数: {len(core_genes)}, 表达矩阵基因数: {len(matrix.genes)}）"
+        )
+
+    z = zscore_rows(raw)
+    columns = [list(col) for col in zip(*z)]
+    return {
+        "pathway_id": pathway.get("ID"),
+        "pathway_description": pathway.get("Description"),
+        "NES": pathway.get("NES"),
+        "p.adjust": pathway.get("p.adjust"),
+        "matrix_kind": matrix.kind,
+        "genes": genes,
+        "samples": list(matrix.samples),
+        "row_order": cluster_order(z),
+        "col_order": cluster_order(columns),
+        # z-scores rounded to 3 decimals keep the payload compact
+        "values": [[round(v, 3) for v in row] for row in z],
+    }
+
+
+@lru_cache(maxsize=128)
+def _heatmap_payload(
+    job_dir_str: str,
+    pathway_id: str,
+    pathway_description: str,
+    expr_mtime_ns: int,
+    core_mtime_ns: int,
+) -> dict[str, Any]:
+    job_dir = Path(job_dir_str)
+    core_path = job_dir / "output" / GSEA_CORE_NAME
+    pathway = _find_pathway(_load_core_genes(str(core_path), core_mtime_ns), pathway_id, pathway_description)
+    if pathway is None:
+        raise HeatmapDataError(f"找不到通路: pathway_id={pathway_id}, pathway_description={pathway_description}")
+    matrix = load_expr_matrix(job_dir)
+    if matrix is None:
+        raise HeatmapDataError("缺少缓存的表达矩阵 cache/expr_matrix.json")
+    return _build(matrix, pathway)
+
+
+def get_heatmap_data(job_dir: Path, *, pathway_id: str, pathway_description: str) -> dict[str, Any]:
+    """
+    Z-scored core-gene matrix plus clustered row/column orders for one GSEA pathway,
+    memoised per (job, pathway) and invalidated when the cached expression
+    matrix or gsea_core_genes.json changes.
+    """
+    sig = expr_matrix_signature(job_dir)
+    if sig is None:
+        raise FileNotFoundError("cache/expr_matrix.json")
+    core_path = job_dir / "output" / GSEA_CORE_NAME
+    try:
+        core_mtime_ns = core_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"output/{GSEA_CORE_NAME}") from None
+    return _heatmap_payload(str(job_dir), pathway_id, pathway_description, sig[1], core_mtime_ns)
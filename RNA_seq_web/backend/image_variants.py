@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import glob
+import hashlib
+import os
+import threading
+import uuid
+from functools import lru_cache
+from pathlib import Path
+
+try:  # Pillow is optional: without it only the original PNGs are served.
+    from PIL import Image, features
+except ImportError:
+    Image = None
+    features = None
+
+
+DERIVED_DIRNAME = "derived"
+THUMB_MAX_PX = 480
+IMAGE_SUFFIXES = frozenset((".png", ".jpg", ".jpeg"))
+VARIANTS = frozenset(("thumb", "webp"))
+
+_pending: set[str] = set()
+_pending_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1024)
+def _hash_file(path_str: str, size: int, mtime_ns: int) -> str:
+    h = hashlib.sha256()
+    with open(path_str, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:20]
+
+
+def content_hash(path: Path) -> str:
+    """Content hash of a file, memoised on (path, size, mtime) so unchanged files are read once."""
+    st = path.stat()
+    return _hash_file(str(path), st.st_size, st.st_mtime_ns)
+
+
+def is_image(path: Path) -> bool:
+    return path.suffix.lower() in IMAGE_SUFFIXES
+
+
+def variants_supported() -> bool:
+    return Image is not None
+
+
+def _webp_supported() -> bool:
+    return features is not None and bool(features.check("webp"))
+
+
+def variant_path(job_dir: Path, source: Path, variant: str, accept_webp: bool = True) -> tuple[Path, str]:
+    """
+    Derived file location and media type; named by content hash so a rewritten
+    source never hits a stale file. `thumb` is WebP only for clients that accept
+    it (callers must send `Vary: Accept`); `webp` is WebP whenever Pillow can write it.
+    """
+    digest = content_hash(source)
+    if _webp_supported() and (accept_webp or variant == "webp"):
+        ext, media_type = ".webp", "image/webp"
+    else:
+        ext, media_type = ".png", "image/png"
+    return job_dir / DERIVED_DIRNAME / f"{source.name}.{digest}.{variant}{ext}", media_type
+
+
+def _prune_superseded(dst: Path) -> None:
+    """Remove variants of the same source and kind rendered from older contents."""
+    source_name, digest, variant, _ext = dst.name.rsplit(".", 3)
+    for old in dst.parent.glob(f"{glob.escape(source_name)}.*.{variant}.*"):
+        parts = old.name.rsplit(".", 3)
+        if len(parts) == 4 and parts[0] == source_name and parts[1] != digest:
+            old.unlink(missing_ok=True)
+
+
+def _render(source: Path, dst: Path, variant: str) -> None:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    with Image.open(source) as im:
+        im.load()
+        if variant == "thumb":
+            im.thumbnail((THUMB_MAX_PX, THUMB_MAX_PX * 4))
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA")
+        tmp = dst.with_name(f".{dst.name}.{uuid.uuid4().hex[:8]}.tmp")
+        if dst.suffix == ".webp":
+            im.save(tmp, format="WEBP", quality=80 if variant == "thumb" else 90, method=4)
+        else:
+            im.save(tmp, format="PNG", optimize=True)
+    os.replace(tmp, dst)
+
+
+def ensure_variant(job_dir: Path, source: Path, variant: str, accept_webp: bool = True) -> tuple[Path, str] | None:
+    """Return (path, media_type) of the variant, rendering it on first use; None when Pillow is unavailable."""
+    if variant not in VARIANTS or not variants_supported() or not is_image(source):
+        return None
+    dst, media_type = variant_path(job_dir, source, variant, accept_webp)
+    if not dst.exists():
+        _render(source, dst, variant)
+        _prune_superseded(dst)
+    return dst, media_type
+
+
+def generate_variants(job_dir: Path, sources: list[Path]) -> None:
+    """Pre-render all variants for newly appeared images (run as a background task)."""
+    for source in sources:
+        try:
+            for variant in sorted(VARIANTS):
+                ensure_variant(job_dir, source, variant)
+        except Exception:
+            # a half-written PNG from a running R stage; retried on a later poll
+            pass
+        finally:
+            with _pending_lock:
+                _pending.discard(str(source))
+
+
+def claim_missing_variants(job_dir: Path, sources: list[Path]) -> list[Path]:
+    """Images whose variants are not on disk yet and are not already being rendered."""
+    if not variants_supported():
+        return []
+    missing: list[Path] = []
+    with _pending_lock:
+        for source in sources:
+            if not is_image(source) or str(source) in _pending:
+                continue
+            try:
+                paths = [variant_path(job_dir, source, v)[0] for v in VARIANTS]
+            except FileNotFoundError:
+                continue
+            if not all(p.exists() for p in paths):
+                _pending.add(str(source))
+                missing.append(source)
+    return missing
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Literal
+
+
+LockResult = Literal["acquired", "coalesced", "busy"]
+
+# A render that has held its lock this long is assumed dead (server restart, killed worker).
+LOCK_STALE_SECONDS = 3600
+MEMO_DIRNAME = "memo"
+# Memoised renders kept per (job, action); the least recently used are evicted.
+MEMO_MAX_ENTRIES = 20
+
+
+def action_key(action: str, params: dict[str, Any], deps: list[Path]) -> str:
+    """
+    Stable key for one in-place render: action name, its parameters and the
+    size/mtime of every file the render reads. Any upstream re-run (new
+    gsea_results.csv, changed script, ...) therefore yields a new key.
+    """
+    dep_sig = []
+    for p in deps:
+        try:
+            st = p.stat()
+            dep_sig.append([str(p), st.st_size, st.st_mtime_ns])
+        except FileNotFoundError:
+            dep_sig.append([str(p), None, None])
+    raw = json.dumps({"action": action, "params": params, "deps": dep_sig}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _read_lock(lock_path: Path) -> dict[str, Any] | None:
+    try:
+        data = json.loads(lock_path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def acquire_action_lock(lock_path: Path, key: str) -> LockResult:
+    """
+    Atomically take the per-job action lock. The lock file is written under a
+    temporary name and hard-linked into place, so it never exists without its
+    key. If the lock is already held for the same key the caller should attach
+    to that render ("coalesced"); a different key means "busy".
+    """
+    tmp = lock_path.with_name(f"{lock_path.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_text(
+        json.dumps({"key": key, "pid": os.getpid(), "acquired_at": time.time()}),
+        encoding="utf-8",
+    )
+    try:
+        for _ in range(2):
+            try:
+                os.link(tmp, lock_path)
+                return "acquired"
+            except FileExistsError:
+                holder = _read_lock(lock_path)
+                if holder is None:
+                    continue  # released between link() and read; retry once
+                if time.time() - float(holder.get("acquired_at", 0)) > LOCK_STALE_SECONDS:
+                    if _break_stale_lock(lock_path, holder):
+                        continue
+                    holder = _read_lock(lock_path) or holder
+                return "coalesced" if holder.get("key") == key else "busy"
+        return "busy"
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _break_stale_lock(lock_path: Path, holder: dict[str, Any]) -> bool:
+    """
+    Move a stale lock aside under a unique name. Only one waiter's rename can
+    take the file, and it re-checks that what it took is the stale holder it
+    saw (not a fresh lock taken meanwhile) before discarding it. Returns True
+    when the caller should retry acquiring.
+    """
+    aside = lock_path.with_name(f"{lock_path.name}.{uuid.uuid4().hex}.stale")
+    try:
+        os.rename(lock_path, aside)
+    except FileNotFoundError:
+        return True  # another waiter broke it first; compete on link()
+    taken = _read_lock(aside)
+    if taken is not None and (taken.get("key"), taken.get("acquired_at")) != (holder.get("key"), holder.get("acquired_at")):
+        # A fresh lock was taken between our read and rename: hand it back.
+        try:
+            os.link(aside, lock_path)
+        except FileExistsError:
+            pass
+        aside.unlink(missing_ok=True)
+        return False
+    aside.unlink(missing_ok=True)
+    return True
+
+
+def release_action_lock(lock_path: Path, key: str) -> None:
+    holder = _read_lock(lock_path)
+    if holder is None or holder.get("key") == key:
+        lock_path.unlink(missing_ok=True)
+
+
+def _memo_dir(job_dir: Path, action: str, key: str) -> Path:
+    return job_dir / MEMO_DIRNAME / action / key
+
+
+def memo_lookup(job_dir: Path, action: str, key: str) -> dict[str, Any] | None:
+    record_path = _memo_dir(job_dir, action, key) / "memo.json"
+    try:
+        record = json.loads(record_path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    files = record.get("files") or []
+    if not all((record_path.parent / name).is_file() for name in files):
+        return None
+    # mtime of memo.json is the recency used for eviction
+    os.utime(record_path)
+    return record
+
+
+def memo_restore(job_dir: Path, action: str, key: str, record: dict[str, Any]) -> None:
+    """Copy memoised outputs back into output/ (atomic per file)."""
+    src_dir = _memo_dir(job_dir, action, key)
+    out_dir = job_dir / "output"
+    for name in record.get("files") or []:
+        tmp = out_dir / f".{name}.{uuid.uuid4().hex[:8]}.tmp"
+        shutil.copy2(src_dir / name, tmp)
+        os.replace(tmp, out_dir / name)
+
+
+def memo_store(job_dir: Path, action: str, key: str, outputs: list[str], status: dict[str, Any]) -> None:
+    """
+    Snapshot the rendered outputs. Copies (not hard links) because the R
+    scripts rewrite files such as heatmap.png in place.
+    """
+    memo_dir = _memo_dir(job_dir, action, key)
+    if memo_dir.exists():
+        shutil.rmtree(memo_dir, ignore_errors=True)
+    memo_dir.mkdir(parents=True, exist_ok=True)
+    files = []
+    for name in outputs:
+        src = job_dir / "output" / name
+        if src.is_file():
+            shutil.copy2(src, memo_dir / name)
+            files.append(name)
+    tmp = memo_dir / "memo.json.tmp"
+    tmp.write_text(json.dumps({"files": files, "status": status}, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, memo_dir / "memo.json")
+    _evict_memos(memo_dir.parent, MEMO_MAX_ENTRIES)
+
+
+def _evict_memos(action_dir: Path, keep: int) -> None:
+    entries = []
+    for d in action_dir.iterdir():
+        try:
+            entries.append(((d / "memo.json").stat().st_mtime, d))
+        except FileNotFoundError:
+            entries.append((0.0, d))  # incomplete snapshot
+    entries.sort(key=lambda e: e[0], reverse=True)
+    for _, d in entries[keep:]:
+        shutil.rmtree(d, ignore_errors=True)
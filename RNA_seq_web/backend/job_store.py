@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import fcntl
 import json
 import os
+import threading
 import uuid
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
+
+
+STATUS_LOCK_NAME = "status.lock"
+# fcntl record locks are per process; threads of the API server also need this.
+_status_thread_lock = threading.Lock()
 
 
 def _utc_now() -> str:
@@ -58,6 +66,21 @@ def create_job(jobs_root: Path) -> JobPaths:
     return paths
 
 
+@contextmanager
+def status_lock(status_path: Path) -> Iterator[None]:
+    """
+    Exclusive lock on the status.lock sidecar, shared with the R writers
+    (with_status_lock() in analysis/lib.R). Uses lockf (fcntl record locks)
+    because that is what R's filelock package takes; flock would not exclude it.
+    """
+    with _status_thread_lock, status_path.with_name(STATUS_LOCK_NAME).open("a") as f:
+        fcntl.lockf(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.lockf(f, fcntl.LOCK_UN)
+
+
 def write_status(status_path: Path, *, state: str, message: str | None, created_at: str | None, started_at: str | None, finished_at: str | None, extra: dict[str, Any] | None = None) -> None:
     payload: dict[str, Any] = {
         "state": state,
@@ -68,9 +91,26 @@ def write_status(status_path: Path, *, state: str, message: str | None, created_
     }
     if extra:
         payload.update(extra)
-    tmp = status_path.with_suffix(".json.tmp")
-    tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
-    os.replace(tmp, status_path)
+    with status_lock(status_path):
+        tmp = status_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, status_path)
+
+
+def update_status_fields(status_path: Path, fields: dict[str, Any]) -> dict[str, Any]:
+    """
+    Read-modify-write status.json, replacing only the given top-level keys.
+    Unlike write_status(), keys owned by other writers (e.g. other in-place
+    actions' state) are preserved. Held under status_lock() so concurrent
+    writers (API threads, the R job) cannot drop each other's keys.
+    """
+    with status_lock(status_path):
+        payload = read_status(status_path) if status_path.exists() else {}
+        payload.update(fields)
+        tmp = status_path.with_suffix(f".json.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, status_path)
+    return payload
 
 
 def read_status(status_path: Path) -> dict[str, Any]:
@@ -1,24 +1,82 @@
 from __future__ import annotations
 
+import json
 import mimetypes
 import os
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, AsyncIterator, Callable
 
-from fastapi import BackgroundTasks, FastAPI, File, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import BackgroundTasks, FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 
+from .blob_store import BlobStore
 from .config import get_settings
+from .count_matrix import MATRIX_BIN_NAME, MATRIX_INDEX_NAME
+from .deg_index import MAX_COMPARE_JOBS, build_deg_summary, compare_deg_sets, deg_summary_stale, get_gene_index, load_deg_bitsets
+from .executor import get_executor
 from .derived_jobs import create_derived_job
-from .job_store import create_job, read_status, safe_job_dir, write_status
+from .geneset_index import MAX_SEARCH_LIMIT, get_geneset_index
+from .heatmap_data import HeatmapDataError, get_heatmap_data
+from .image_variants import VARIANTS, claim_missing_variants, content_hash, ensure_variant, generate_variants, is_image, variants_supported
+from .inplace_actions import acquire_action_lock, action_key, memo_lookup, memo_restore, memo_store, release_action_lock
+from .job_store import JobPaths, create_job, read_status, safe_job_dir, update_status_fields
+from .pca import load_pca_components, select_pca_view
+from .r_probe import AdmissionError, RProbe, admit_genesets, admit_modules, require_script_packages, tf_network_available
 from .r_runner import launch_r_job, run_r_action
-from .schemas import JobCreateResponse, JobOutputItem, JobStatusResponse
+from .schemas import CompareRequest, JobBatchResponse, JobCreateResponse, JobOutputItem, JobParamSet, JobStatusResponse
+from .tracing import TraceMiddleware, TraceWriter, configure_tracing, span
 
 
-app = FastAPI(title="RNA-seq Web (FastAPI)", version="0.1.0")
 settings = get_settings()
+executor = get_executor(settings)
+gene_index = get_gene_index(settings.index_dir)
+trace_writer = TraceWriter(settings.trace_dir, sample_rate=settings.trace_sample_rate)
+configure_tracing(trace_writer)
+r_probe = RProbe(settings, ttl_seconds=settings.probe_ttl_seconds)
+blob_store = BlobStore(settings.blob_dir)
+
+
+def _warm_geneset_index() -> None:
+    # Build the GMT search indexes off the request path; the first search then hits memory.
+    def build() -> None:
+        for sub in ("human", "mouse"):
+            try:
+                get_geneset_index(settings.msigdb_dir, sub)
+            except (OSError, UnicodeDecodeError):
+                pass
+
+    threading.Thread(target=build, name="geneset-index", daemon=True).start()
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    trace_writer.start()
+    r_probe.refresh_in_background()
+    _warm_geneset_index()
+    try:
+        yield
+    finally:
+        # Drain buffered spans before the process exits.
+        trace_writer.close()
+
+
+app = FastAPI(title="RNA-seq Web (FastAPI)", version="0.1.0", lifespan=lifespan)
+app.add_middleware(TraceMiddleware)
+
+
+# Columnar copies of tabular outputs (see write_parquet_table in analysis/lib.R)
+mimetypes.add_type("application/vnd.apache.parquet", ".parquet")
+
+TF_DATABASES = frozenset(("collectri", "dorothea"))
+TF_METHODS = frozenset(("ulm", "wmean", "viper"))
+MAX_BATCH_JOBS = 50
 
 
 def _list_outputs(job_id: str, job_dir: Path) -> list[JobOutputItem]:
@@ -27,18 +85,32 @@ def _list_outputs(job_id: str, job_dir: Path) -> list[JobOutputItem]:
         return []
     items: list[JobOutputItem] = []
     for p in sorted(out_dir.glob("*")):
-        if not p.is_file():
+        # dot-prefixed names are in-flight temp files of atomic replaces
+        if not p.is_file() or p.name.startswith("."):
             continue
         size = 0
         try:
             size = p.stat().st_size
         except Exception:
             pass
+        url = f"/api/jobs/{job_id}/outputs/{p.name}"
+        thumb_url = None
+        if is_image(p):
+            # Content-versioned URLs can be cached as immutable by the browser.
+            try:
+                version = content_hash(p)
+            except OSError:
+                version = ""
+            if version:
+                url = f"{url}?v={version}"
+                if variants_supported():
+                    thumb_url = f"{url}&variant=thumb"
         items.append(
             JobOutputItem(
                 name=p.name,
-                url=f"/api/jobs/{job_id}/outputs/{p.name}",
+                url=url,
                 size_bytes=size,
+                thumb_url=thumb_url,
             )
         )
     return items
@@ -61,22 +133,31 @@ if settings.frontend_dir.exists():
 
 @app.get("/api/health")
 def health() -> dict[str, Any]:
+    # r_env 为缓存的 R 环境探测结果（包版本 / TF 网络缓存 / MSigDB 文件），首次探测完成前为 null
+    probe = r_probe.snapshot()
     return {
         "ok": True,
         "jobs_root": str(settings.jobs_root),
         "msigdb_dir": str(settings.msigdb_dir),
         "rscript": settings.rscript_path,
+        "r_env": probe,
+        "r_env_ready": bool(probe and probe["modules"]["core"]),
     }
 
 
-@app.get("/api/genesets")
-def list_genesets(species: str) -> dict[str, Any]:
+def _species_subdir(species: str) -> str | None:
     species = species.strip().lower()
     if species in ("homo sapiens", "human", "hs"):
-        sub = "human"
-    elif species in ("mus musculus", "mouse", "mm"):
-        sub = "mouse"
-    else:
+        return "human"
+    if species in ("mus musculus", "mouse", "mm"):
+        return "mouse"
+    return None
+
+
+@app.get("/api/genesets")
+def list_genesets(species: str) -> dict[str, Any]:
+    sub = _species_subdir(species)
+    if sub is None:
         raise HTTPException(status_code=400, detail="species must be human or mouse")
 
     dir_path = settings.msigdb_dir / sub
@@ -94,6 +175,210 @@ def list_genesets(species: str) -> dict[str, Any]:
         )
     return {"species": sub, "files": gmt_files, "mode": "local"}
 
+
+@app.get("/api/genesets/search")
+def search_genesets(species: str, gene: str = "", q: str = "", offset: int = 0, limit: int = 50) -> dict[str, Any]:
+    """
+    在本地 MSigDB 全部 GMT 中查找：`gene` 为包含该基因的基因集（精确匹配，末尾 `*` 表示前缀），
+    `q` 为名称检索（每个词按前缀匹配名称中的词）；两者同时给出时取交集。
+    倒排索引常驻内存，GMT 文件变化（mtime/大小）时自动重建。
+    """
+    sub = _species_subdir(species)
+    if sub is None:
+        raise HTTPException(status_code=400, detail="species must be human or mouse")
+    if not gene.strip() and not q.strip():
+        raise HTTPException(status_code=400, detail="gene 或 q 必须提供一个")
+    if offset < 0 or not 1 <= limit <= MAX_SEARCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"offset must be >= 0 and limit in 1..{MAX_SEARCH_LIMIT}")
+    try:
+        index = get_geneset_index(settings.msigdb_dir, sub)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=500,
+            detail=f"MSigDB directory not found: {settings.msigdb_dir / sub}. Set RNA_SEQ_WEB_MSIGDB_DIR to your local msigdb root.",
+        )
+    try:
+        result = index.search(gene=gene, query=q, offset=offset, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"species": sub, "gene": gene, "q": q, **result}
+
+
+def _admit_job(opts: JobParamSet, probe: dict[str, Any] | None) -> dict[str, Any]:
+    """
+    Validate one parameter set and admit it against the cached R environment
+    probe. Raises HTTPException; nothing is stored before this passes.
+    """
+    tf_database = opts.tf_database.strip().lower()
+    tf_method = opts.tf_method.strip().lower()
+    if tf_database not in TF_DATABASES:
+        raise HTTPException(status_code=400, detail=f"tf_database must be one of {sorted(TF_DATABASES)}")
+    if tf_method not in TF_METHODS:
+        raise HTTPException(status_code=400, detail=f"tf_method must be one of {sorted(TF_METHODS)}")
+    dorothea_levels = sorted({lv.strip().upper() for lv in opts.tf_dorothea_levels.split(",") if lv.strip()})
+    if not dorothea_levels or dorothea_levels != ["A", "B", "C", "D"][: len(dorothea_levels)]:
+        # cache/ only ships the cumulative confidence level sets (A, AB, ABC, ABCD)
+        raise HTTPException(status_code=400, detail="tf_dorothea_levels must be one of A / A,B / A,B,C / A,B,C,D")
+
+    try:
+        modules, warnings = admit_modules(
+            probe,
+            {
+                "pca": bool(opts.run_pca),
+                "deseq2": bool(opts.run_deseq2),
+                "gsea": bool(opts.run_gsea),
+                "gsva": bool(opts.run_gsva),
+                "tf": bool(opts.run_tf),
+                "heatmap": bool(opts.run_heatmap),
+            },
+        )
+    except AdmissionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    species_sub = _species_subdir(opts.species)
+    if species_sub is not None and (modules["gsea"] or modules["gsva"]):
+        missing_gmt = admit_genesets(probe, species_sub, opts.gmt_file)
+        if missing_gmt and opts.gmt_file:
+            raise HTTPException(status_code=400, detail=missing_gmt)
+        if missing_gmt:
+            for name in ("gsea", "gsva"):
+                if modules[name]:
+                    modules[name] = False
+                    warnings.append(f"已跳过 {name}: {missing_gmt}")
+    if modules["tf"] and species_sub is not None and not tf_network_available(probe, tf_database, species_sub, dorothea_levels):
+        warnings.append(f"TF 网络 {tf_database} 未在 cache/ 中预置，运行时将通过 OmnipathR 下载")
+    return {
+        "tf_database": tf_database,
+        "tf_method": tf_method,
+        "dorothea_levels": dorothea_levels,
+        "modules": modules,
+        "warnings": warnings,
+        "probed_at": probe["probed_at"] if probe else None,
+    }
+
+
+async def _store_uploads(count_file: UploadFile, metadata_file: UploadFile) -> dict[str, Any]:
+    """
+    Stream both uploads into the blob store and parse the counts table into the
+    binary matrix (once per distinct upload). Parse errors are a 400 and leave
+    no job directory behind.
+    """
+    # Keep original extensions: the R side picks the delimiter from them.
+    count_ext = Path(count_file.filename or "").suffix.lower() or ".csv"
+    meta_ext = Path(metadata_file.filename or "").suffix.lower() or ".csv"
+    with span("job.save_uploads") as attrs:
+        counts = await run_in_threadpool(blob_store.ingest_file, count_file.file)
+        metadata = await run_in_threadpool(blob_store.ingest_file, metadata_file.file)
+        attrs.update(counts_blob=counts.digest, counts_bytes=counts.size, counts_refs=blob_store.refcount(counts.path))
+    try:
+        with span("job.convert_counts", counts_blob=counts.digest):
+            matrix_dir, matrix_index = await run_in_threadpool(blob_store.ensure_count_matrix, counts, count_ext)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"counts 文件解析失败: {e}")
+    return {
+        "counts": counts,
+        "count_ext": count_ext,
+        "metadata": metadata,
+        "meta_ext": meta_ext,
+        "matrix_dir": matrix_dir,
+        "matrix_index": matrix_index,
+    }
+
+
+def _prepare_job(
+    opts: JobParamSet,
+    admission: dict[str, Any],
+    inputs: dict[str, Any],
+    analysis_script: Path,
+) -> tuple[JobCreateResponse, dict[str, Any]]:
+    """
+    Create a job whose input/ files are links to the stored blobs. Returns the
+    response and the launch_r_job() arguments; nothing is launched yet, and a
+    failure removes the half-created job directory.
+    """
+    settings.jobs_root.mkdir(parents=True, exist_ok=True)
+    paths = create_job(settings.jobs_root)
+    try:
+        return _fill_job(paths, opts, admission, inputs, analysis_script)
+    except BaseException:
+        shutil.rmtree(paths.job_dir, ignore_errors=True)
+        raise
+
+
+def _fill_job(
+    paths: JobPaths,
+    opts: JobParamSet,
+    admission: dict[str, Any],
+    inputs: dict[str, Any],
+    analysis_script: Path,
+) -> tuple[JobCreateResponse, dict[str, Any]]:
+    count_dst = paths.input_dir / f"counts{inputs['count_ext']}"
+    meta_dst = paths.input_dir / f"metadata{inputs['meta_ext']}"
+    with span("job.link_inputs", job_id=paths.job_id):
+        blob_store.link(inputs["counts"].path, count_dst)
+        blob_store.link(inputs["metadata"].path, meta_dst)
+        for name in (MATRIX_BIN_NAME, MATRIX_INDEX_NAME):
+            blob_store.link(inputs["matrix_dir"] / name, paths.input_dir / name)
+
+    params: dict[str, Any] = {
+        "job_id": paths.job_id,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "input": {
+            "counts_path": str(count_dst),
+            "metadata_path": str(meta_dst),
+            "counts_matrix": str(paths.input_dir / MATRIX_INDEX_NAME),
+            "duplicates_merged": int(inputs["matrix_index"].get("duplicates_merged", 0)),
+            "counts_blob": inputs["counts"].digest,
+            "metadata_blob": inputs["metadata"].digest,
+        },
+        "min_count_filter": int(opts.min_count_filter),
+        "design_var": opts.design_var,
+        "contrast_num": opts.contrast_num,
+        "contrast_denom": opts.contrast_denom,
+        "padj_threshold": float(opts.padj_threshold),
+        "lfc_threshold": float(opts.lfc_threshold),
+        "modules": admission["modules"],
+        "admission": {
+            "warnings": admission["warnings"],
+            "probed_at": admission["probed_at"],
+        },
+        "species": opts.species,
+        "gmt_file": opts.gmt_file,
+        "heatmap_genes": opts.heatmap_genes,
+        "gsea": {
+            "progressive": bool(opts.gsea_progressive),
+        },
+        "gsva": {
+            "workers": settings.gsva_workers,
+            "memory_budget_mb": settings.gsva_memory_mb,
+        },
+        "tf": {
+            "database": admission["tf_database"],
+            "method": admission["tf_method"],
+            "dorothea_levels": admission["dorothea_levels"],
+        },
+        "msigdb_dir": str(settings.msigdb_dir),
+        "cache_dir": str(settings.cache_dir),
+        "project_root": str(settings.project_root),
+    }
+
+    launch = {
+        "rscript": settings.rscript_path,
+        "analysis_script": analysis_script,
+        "job_dir": paths.job_dir,
+        "params": params,
+        "log_path": paths.run_log,
+        "executor": executor,
+    }
+    return JobCreateResponse(job_id=paths.job_id, warnings=admission["warnings"]), launch
+
+
+def _analysis_script() -> Path:
+    analysis_script = settings.project_root / "analysis" / "run_job.R"
+    if not analysis_script.exists():
+        raise HTTPException(status_code=500, detail=f"analysis script not found: {analysis_script}")
+    return analysis_script
+
+
 @app.post("/api/jobs", response_model=JobCreateResponse)
 async def create_job_api(
     background_tasks: BackgroundTasks,
@@ -118,70 +403,140 @@ async def create_job_api(
     gmt_file: str = Form(""),
     # Heatmap genes
     heatmap_genes: str = Form(""),
+    # TF activity (decoupleR)
+    tf_database: str = Form("collectri"),
+    tf_method: str = Form("ulm"),
+    tf_dorothea_levels: str = Form("A,B,C"),
+    # GSEA: publish a coarse preview first, refine p-values in a separate R process
+    gsea_progressive: bool = Form(True),
 ) -> JobCreateResponse:
-    settings.jobs_root.mkdir(parents=True, exist_ok=True)
-    paths = create_job(settings.jobs_root)
-
-    # Save uploads (keep original extensions when possible)
-    count_ext = Path(count_file.filename).suffix.lower() or ".csv"
-    meta_ext = Path(metadata_file.filename).suffix.lower() or ".csv"
-    count_dst = paths.input_dir / f"counts{count_ext}"
-    meta_dst = paths.input_dir / f"metadata{meta_ext}"
+    opts = JobParamSet(
+        min_count_filter=min_count_filter,
+        design_var=design_var,
+        contrast_num=contrast_num,
+        contrast_denom=contrast_denom,
+        padj_threshold=padj_threshold,
+        lfc_threshold=lfc_threshold,
+        run_pca=run_pca,
+        run_deseq2=run_deseq2,
+        run_gsea=run_gsea,
+        run_gsva=run_gsva,
+        run_tf=run_tf,
+        run_heatmap=run_heatmap,
+        species=species,
+        gmt_file=gmt_file,
+        heatmap_genes=heatmap_genes,
+        tf_database=tf_database,
+        tf_method=tf_method,
+        tf_dorothea_levels=tf_dorothea_levels,
+        gsea_progressive=gsea_progressive,
+    )
+    # Admission against the cached R environment probe: fail before any upload is stored or R starts.
+    admission = _admit_job(opts, r_probe.snapshot())
+    analysis_script = _analysis_script()
+    inputs = await _store_uploads(count_file, metadata_file)
+    response, launch = _prepare_job(opts, admission, inputs, analysis_script)
+    background_tasks.add_task(launch_r_job, **launch)
+    return response
 
-    paths.input_dir.mkdir(parents=True, exist_ok=True)
-    count_dst.write_bytes(await count_file.read())
-    meta_dst.write_bytes(await metadata_file.read())
 
-    params: dict[str, Any] = {
-        "job_id": paths.job_id,
-        "created_at": datetime.utcnow().isoformat() + "Z",
-        "input": {
-            "counts_path": str(count_dst),
-            "metadata_path": str(meta_dst),
-        },
-        "min_count_filter": int(min_count_filter),
-        "design_var": design_var,
-        "contrast_num": contrast_num,
-        "contrast_denom": contrast_denom,
-        "padj_threshold": float(padj_threshold),
-        "lfc_threshold": float(lfc_threshold),
-        "modules": {
-            "pca": bool(run_pca),
-            "deseq2": bool(run_deseq2),
-            "gsea": bool(run_gsea),
-            "gsva": bool(run_gsva),
-            "tf": bool(run_tf),
-            "heatmap": bool(run_heatmap),
-        },
-        "species": species,
-        "gmt_file": gmt_file,
-        "heatmap_genes": heatmap_genes,
-        "msigdb_dir": str(settings.msigdb_dir),
-        "cache_dir": str(settings.cache_dir),
-        "project_root": str(settings.project_root),
-    }
+def _parse_param_sets(raw: str) -> list[JobParamSet]:
+    try:
+        entries = json.loads(raw)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"param_sets 不是合法的 JSON: {e}")
+    if not isinstance(entries, list) or not entries:
+        raise HTTPException(status_code=400, detail="param_sets 必须是非空的 JSON 数组")
+    if len(entries) > MAX_BATCH_JOBS:
+        raise HTTPException(status_code=400, detail=f"一次最多提交 {MAX_BATCH_JOBS} 个任务")
+    known = set(getattr(JobParamSet, "model_fields", None) or JobParamSet.__fields__)
+    out: list[JobParamSet] = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise HTTPException(status_code=400, detail=f"param_sets[{i}] 必须是 JSON 对象")
+        unknown = sorted(set(entry) - known)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"param_sets[{i}] 含未知参数: {', '.join(unknown)}")
+        try:
+            out.append(JobParamSet(**entry))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"param_sets[{i}] 参数无效: {e}")
+    return out
 
-    analysis_script = settings.project_root / "analysis" / "run_job.R"
-    if not analysis_script.exists():
-        raise HTTPException(status_code=500, detail=f"analysis script not found: {analysis_script}")
 
-    background_tasks.add_task(
-        launch_r_job,
-        rscript=settings.rscript_path,
-        analysis_script=analysis_script,
-        job_dir=paths.job_dir,
-        params=params,
-        log_path=paths.run_log,
-    )
-    return JobCreateResponse(job_id=paths.job_id)
+@app.post("/api/jobs/batch", response_model=JobBatchResponse)
+async def create_job_batch_api(
+    background_tasks: BackgroundTasks,
+    count_file: UploadFile = File(...),
+    metadata_file: UploadFile = File(...),
+    # JSON array of objects with the same fields as the POST /api/jobs form
+    param_sets: str = Form(...),
+) -> JobBatchResponse:
+    """
+    一次上传 counts/metadata，按多组参数批量创建任务：输入只存储、解析一次，
+    各任务的 input/ 通过硬链接共享同一份文件。全部参数通过校验与准入后才开始创建。
+    """
+    opts_list = _parse_param_sets(param_sets)
+    probe = r_probe.snapshot()
+    admissions: list[dict[str, Any]] = []
+    for i, opts in enumerate(opts_list):
+        try:
+            admissions.append(_admit_job(opts, probe))
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"param_sets[{i}]: {e.detail}")
+    analysis_script = _analysis_script()
+    inputs = await _store_uploads(count_file, metadata_file)
+    # All-or-nothing: every job directory is created before any R run is scheduled,
+    # and the ones already created are removed if a later one fails.
+    prepared: list[tuple[JobCreateResponse, dict[str, Any]]] = []
+    try:
+        for opts, admission in zip(opts_list, admissions):
+            prepared.append(_prepare_job(opts, admission, inputs, analysis_script))
+    except BaseException:
+        for _, launch in prepared:
+            shutil.rmtree(launch["job_dir"], ignore_errors=True)
+        raise
+    for _, launch in prepared:
+        background_tasks.add_task(launch_r_job, **launch)
+    jobs = [response for response, _ in prepared]
+    return JobBatchResponse(counts_blob=inputs["counts"].digest, metadata_blob=inputs["metadata"].digest, jobs=jobs)
+
+
+_seen_outputs: OrderedDict[str, tuple[Any, ...]] = OrderedDict()
+_seen_outputs_lock = threading.Lock()
+_SEEN_OUTPUTS_MAX = 4096
+
+
+def _outputs_changed(job_id: str, signature: tuple[Any, ...]) -> bool:
+    with _seen_outputs_lock:
+        if _seen_outputs.get(job_id) == signature:
+            _seen_outputs.move_to_end(job_id)
+            return False
+        _seen_outputs[job_id] = signature
+        _seen_outputs.move_to_end(job_id)
+        while len(_seen_outputs) > _SEEN_OUTPUTS_MAX:
+            _seen_outputs.popitem(last=False)
+        return True
 
 
 @app.get("/api/jobs/{job_id}", response_model=JobStatusResponse)
-def get_job_status(job_id: str) -> JobStatusResponse:
+def get_job_status(job_id: str, background_tasks: BackgroundTasks) -> JobStatusResponse:
     job_dir = safe_job_dir(settings.jobs_root, job_id)
     status = read_status(job_dir / "status.json")
     outputs = _list_outputs(job_id, job_dir)
 
+    # Follow-up work runs once per change of state/outputs (image URLs carry the
+    # content hash), not on every poll of an unchanged job.
+    if _outputs_changed(job_id, (status.get("state"), tuple((o.name, o.size_bytes, o.url) for o in outputs))):
+        # Render thumbnail/WebP variants once, as soon as new images appear.
+        new_images = claim_missing_variants(job_dir, [job_dir / "output" / o.name for o in outputs if o.thumb_url])
+        if new_images:
+            background_tasks.add_task(generate_variants, job_dir, new_images)
+
+        # Map the finished job's DEG sets into the global gene index for /api/compare.
+        if status.get("state") == "success" and deg_summary_stale(job_dir, gene_index):
+            background_tasks.add_task(build_deg_summary, job_dir, gene_index)
+
     # Some actions (inplace plotting) store their state at top-level in status.json
     # due to legacy write_status() behavior (flattening "extra"). Normalize here so
     # frontend can always read st.extra.* consistently.
@@ -191,35 +546,8 @@ def get_job_status(job_id: str) -> JobStatusResponse:
     for k in ("gsea_single_plot", "heatmap_from_gsea", "volcano_inplace"):
         if k not in extra_out and isinstance(status.get(k), dict):
             extra_out[k] = status[k]
-
-    # #region agent log (debug-session)
-    try:
-        import json as _json
-        from time import time as _time
-        with open("/home/zhs/.cursor/debug.log", "a", encoding="utf-8") as _f:
-            _f.write(
-                _json.dumps(
-                    {
-                        "sessionId": "debug-session",
-                        "runId": "backend",
-                        "hypothesisId": "H",
-                        "location": "backend/main.py:get_job_status",
-                        "message": "status_extra_normalized",
-                        "data": {
-                            "jobId": job_id,
-                            "hasExtraField": isinstance(status.get("extra"), dict),
-                            "normalizedKeys": sorted(list(extra_out.keys()))[:20],
-                            "outputsCount": len(outputs),
-                        },
-                        "timestamp": int(_time() * 1000),
-                    },
-                    ensure_ascii=False,
-                )
-                + "\n"
-            )
-    except Exception:
-        pass
-    # #endregion
+    if status.get("worker_id"):
+        extra_out["worker_id"] = status["worker_id"]
 
     def parse_dt(s: Any) -> datetime | None:
         if not s or not isinstance(s, str):
@@ -241,6 +569,73 @@ def get_job_status(job_id: str) -> JobStatusResponse:
     )
 
 
+@app.get("/api/jobs/{job_id}/pca")
+def get_pca_view(job_id: str, pcs: str = "1,2", color: str = "") -> dict[str, Any]:
+    """
+    从缓存的 pca_components.json 取任意两个主成分与着色变量，
+    切换坐标轴/着色不需要重新计算，也不启动 R。
+    """
+    job_dir = safe_job_dir(settings.jobs_root, job_id)
+    components = load_pca_components(job_dir)
+    if components is None:
+        raise HTTPException(status_code=404, detail="缺少 output/pca_components.json（请先运行 PCA）")
+    try:
+        view = select_pca_view(components, pcs=pcs, color=color)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"job_id": job_id, **view}
+
+
+@app.get("/api/jobs/{job_id}/heatmap_data")
+def get_heatmap_data_api(job_id: str, pathway_id: str = "", pathway_description: str = "") -> dict[str, Any]:
+    """
+    返回某条 GSEA 通路 core genes 的 Z-score 矩阵与行/列聚类顺序，供前端直接绘制、重排；
+    数据来自主任务缓存的表达矩阵，按通路做 LRU 缓存，不启动 R。
+    """
+    job_dir = safe_job_dir(settings.jobs_root, job_id)
+    if not pathway_id and not pathway_description:
+        raise HTTPException(status_code=400, detail="pathway_id 或 pathway_description 必须提供一个")
+    try:
+        data = get_heatmap_data(job_dir, pathway_id=pathway_id, pathway_description=pathway_description)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"缺少 {e.args[0] if e.args else e}")
+    except HeatmapDataError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"job_id": job_id, **data}
+
+
+@app.post("/api/compare")
+def compare_jobs(req: CompareRequest) -> dict[str, Any]:
+    """
+    跨 job 比较显著差异基因：两两交集数、Jaccard 与共享基因列表。
+    基于全局基因索引上的每 job 位图摘要（cache/deg_summary.json），不重新解析 CSV。
+    """
+    job_ids = list(dict.fromkeys(req.job_ids))
+    if len(job_ids) < 2:
+        raise HTTPException(status_code=400, detail="job_ids 至少需要 2 个不同的 job")
+    if len(job_ids) > MAX_COMPARE_JOBS:
+        raise HTTPException(status_code=400, detail=f"一次最多比较 {MAX_COMPARE_JOBS} 个 job")
+
+    jobs = []
+    for job_id in job_ids:
+        try:
+            job_dir = safe_job_dir(settings.jobs_root, job_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"{job_id}: 非法的 job_id")
+        if not job_dir.is_dir():
+            raise HTTPException(status_code=404, detail=f"{job_id}: job 不存在")
+        try:
+            loaded = load_deg_bitsets(job_dir, gene_index)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise HTTPException(status_code=400, detail=f"{job_id}: 无法读取 DEG 结果: {e}")
+        if loaded is None:
+            raise HTTPException(status_code=404, detail=f"{job_id}: 缺少 output/deg_sets.json（请先运行 DESeq2）")
+        jobs.append((job_id, *loaded))
+
+    with span("compare.deg_sets", n_jobs=len(jobs), direction=req.direction):
+        return compare_deg_sets(jobs, gene_index, direction=req.direction, max_genes=req.max_genes)
+
+
 @app.post("/api/jobs/{job_id}/volcano", response_model=JobCreateResponse)
 def derive_volcano_job(
     job_id: str,
@@ -249,6 +644,10 @@ def derive_volcano_job(
     mark_genes: str = Form(""),
 ) -> JobCreateResponse:
     parent_dir = safe_job_dir(settings.jobs_root, job_id)
+    try:
+        require_script_packages(r_probe.snapshot(), "plot_volcano.R")
+    except AdmissionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     parent_out = parent_dir / "output" / "deseq2_results.csv"
     if not parent_out.exists():
         raise HTTPException(status_code=400, detail="parent job missing output/deseq2_results.csv")
@@ -276,6 +675,7 @@ def derive_volcano_job(
         job_dir=paths.job_dir,
         params=params,
         log_path=paths.run_log,
+        executor=executor,
     )
     return JobCreateResponse(job_id=paths.job_id)
 
@@ -288,6 +688,10 @@ def derive_heatmap_from_gsea_job(
     pathway_description: str = Form(""),
 ) -> JobCreateResponse:
     parent_dir = safe_job_dir(settings.jobs_root, job_id)
+    try:
+        require_script_packages(r_probe.snapshot(), "plot_heatmap.R")
+    except AdmissionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     parent_out = parent_dir / "output" / "gsea_results.csv"
     if not parent_out.exists():
         raise HTTPException(status_code=400, detail="parent job missing output/gsea_results.csv")
@@ -317,101 +721,127 @@ def derive_heatmap_from_gsea_job(
         job_dir=paths.job_dir,
         params=params,
         log_path=paths.run_log,
+        executor=executor,
     )
     return JobCreateResponse(job_id=paths.job_id)
 
 
 @app.get("/api/jobs/{job_id}/outputs/{filename}")
-def download_output_file(job_id: str, filename: str) -> FileResponse:
+def download_output_file(request: Request, job_id: str, filename: str, variant: str = "", v: str = "") -> Response:
+    """
+    下载单个输出。`variant=thumb|webp` 返回缩略图 / WebP（需 Pillow，缺失时回退原图）。
+    ETag 为内容哈希；URL 带有与当前内容一致的 `v` 时按不可变资源长期缓存，否则要求每次协商（304）。
+    """
     job_dir = safe_job_dir(settings.jobs_root, job_id)
     out_path = (job_dir / "output" / filename).resolve()
     if (job_dir / "output").resolve() not in out_path.parents:
         raise HTTPException(status_code=400, detail="invalid filename")
     if not out_path.exists() or not out_path.is_file():
         raise HTTPException(status_code=404, detail="file not found")
+    if variant and variant not in VARIANTS:
+        raise HTTPException(status_code=400, detail=f"variant must be one of {sorted(VARIANTS)}")
+
+    digest = content_hash(out_path)
+    serve_path, media_type, download_name = out_path, None, out_path.name
+    if variant:
+        # The thumbnail format is negotiated on Accept (WebP where the client takes it).
+        accept_webp = "image/webp" in request.headers.get("accept", "")
+        derived = ensure_variant(job_dir, out_path, variant, accept_webp)
+        if derived is not None:
+            serve_path, media_type = derived
+            download_name = f"{out_path.stem}.{variant}{serve_path.suffix}"
+    etag = f'"{digest}-{variant}{serve_path.suffix}"' if variant else f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable" if v == digest else "no-cache",
+    }
+    if variant:
+        headers["Vary"] = "Accept"
 
-    mime, _ = mimetypes.guess_type(out_path.name)
-    return FileResponse(path=str(out_path), media_type=mime or "application/octet-stream", filename=out_path.name)
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
 
+    if media_type is None:
+        mime, _ = mimetypes.guess_type(serve_path.name)
+        media_type = mime or "application/octet-stream"
+    return FileResponse(path=str(serve_path), media_type=media_type, filename=download_name, headers=headers)
 
-@app.post("/api/jobs/{job_id}/heatmap_from_gsea_inplace", response_model=JobCreateResponse)
-def generate_heatmap_from_gsea_inplace(
+
+def _submit_inplace_action(
+    *,
     job_id: str,
+    job_dir: Path,
     background_tasks: BackgroundTasks,
-    pathway_id: str = Form(""),
-    pathway_description: str = Form(""),
+    action: str,
+    status_key: str,
+    script_name: str,
+    r_params: dict[str, Any],
+    key_params: dict[str, Any],
+    deps: list[Path],
+    outputs: list[str],
+    required_output: str,
+    info: dict[str, Any],
+    messages: dict[str, str],
+    on_acquired: Callable[[], None] | None = None,
 ) -> JobCreateResponse:
     """
-    就地生成热图（不创建新 job）：从父 job 的 GSEA 结果选择通路，
-    在同一 job_dir/output/ 下生成/覆盖 heatmap.png。
-    使用锁避免并发，用 status.json 的 extra 字段记录动作状态。
+    Shared flow of the in-place plot actions:
+
+    - atomic per-action lock; an identical request that arrives while a render
+      is in flight attaches to it instead of getting 409
+    - per-job memo keyed on (action, parameters, input file signatures): a repeat
+      request restores the memoised outputs without starting R
+    - otherwise run the R script in the background and record the action state in
+      status.json (other keys are preserved)
+
+    on_acquired runs only once this request holds the lock (not for busy or
+    coalesced requests), before the memo lookup.
     """
-    job_dir = safe_job_dir(settings.jobs_root, job_id)
-    
-    # 校验必需文件
-    gsea_results = job_dir / "output" / "gsea_results.csv"
-    gsea_core = job_dir / "output" / "gsea_core_genes.json"
-    if not gsea_results.exists():
-        raise HTTPException(status_code=400, detail="缺少 output/gsea_results.csv")
-    if not gsea_core.exists():
-        raise HTTPException(status_code=400, detail="缺少 output/gsea_core_genes.json")
-    
-    if not pathway_id and not pathway_description:
-        raise HTTPException(status_code=400, detail="pathway_id 或 pathway_description 必须提供一个")
-    
-    # 并发锁：避免同时生成多个热图覆盖
-    lock_file = job_dir / ".lock_heatmap"
-    if lock_file.exists():
-        raise HTTPException(status_code=409, detail="热图正在生成中，请稍后再试")
-    
-    # 写锁
-    lock_file.write_text("locked", encoding="utf-8")
-    
-    # 准备参数（不覆盖主 params.json，单独写一个 heatmap_request.json）
-    import json
     from datetime import datetime, timezone
-    
-    heatmap_req = {
-        "job_id": job_id,
-        "pathway_id": pathway_id,
-        "pathway_description": pathway_description,
-        "requested_at": datetime.now(timezone.utc).isoformat(),
-    }
-    heatmap_req_path = job_dir / "output" / "heatmap_request.json"
-    heatmap_req_path.write_text(json.dumps(heatmap_req, ensure_ascii=False, indent=2), encoding="utf-8")
-    
-    # 更新 status.json 的 extra.heatmap_from_gsea（不改主状态）
-    status_path = job_dir / "status.json"
-    status = read_status(status_path)
-    extra = status.get("extra", {}) if isinstance(status.get("extra"), dict) else {}
-    extra["heatmap_from_gsea"] = {
-        "state": "running",
-        "message": "正在生成热图...",
-        "started_at": datetime.now(timezone.utc).isoformat(),
-    }
-    write_status(
-        status_path,
-        state=status.get("state", "success"),
-        message=status.get("message"),
-        created_at=status.get("created_at"),
-        started_at=status.get("started_at"),
-        finished_at=status.get("finished_at"),
-        extra=extra,
-    )
-    
-    # 启动 R 脚本（新建一个 plot_heatmap_inplace.R）
-    analysis_script = settings.project_root / "analysis" / "plot_heatmap_inplace.R"
+
+    analysis_script = settings.project_root / "analysis" / script_name
     if not analysis_script.exists():
-        lock_file.unlink(missing_ok=True)
-        raise HTTPException(status_code=500, detail=f"分析脚本不存在: {analysis_script}")
-    
-    # 用一个临时 params 传给 R（禁止覆盖主 params.json）
-    temp_params = {
-        "job_id": job_id,
-        "job_dir": str(job_dir),
-        "pathway_id": pathway_id,
-        "pathway_description": pathway_description,
-    }
+        raise HTTPException(status_code=500, detail=f"analysis script not found: {analysis_script}")
+    try:
+        require_script_packages(r_probe.snapshot(), script_name)
+    except AdmissionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    status_path = job_dir / "status.json"
+    lock_file = job_dir / f".lock_{action}"
+    key = action_key(action, key_params, [*deps, analysis_script])
+
+    with span("inplace.lock", action=action) as attrs:
+        lock = acquire_action_lock(lock_file, key)
+        attrs["result"] = lock
+    if lock == "coalesced":
+        return JobCreateResponse(job_id=job_id)
+    if lock == "busy":
+        raise HTTPException(status_code=409, detail=messages["busy"])
+
+    try:
+        if on_acquired is not None:
+            on_acquired()
+        with span("inplace.memo_lookup", action=action) as attrs:
+            memo = memo_lookup(job_dir, action, key)
+            attrs["hit"] = memo is not None
+        if memo is not None:
+            memo_restore(job_dir, action, key, memo)
+            update_status_fields(
+                status_path,
+                {status_key: {**(memo.get("status") or {}), "cached": True, "finished_at": datetime.now(timezone.utc).isoformat()}},
+            )
+            release_action_lock(lock_file, key)
+            return JobCreateResponse(job_id=job_id)
+
+        update_status_fields(
+            status_path,
+            {status_key: {"state": "running", "message": messages["running"], "started_at": datetime.now(timezone.utc).isoformat(), **info}},
+        )
+    except Exception:
+        release_action_lock(lock_file, key)
+        raise
 
     def _run_and_cleanup() -> None:
         # 运行并等待（后台任务中阻塞，不影响请求线程）
@@ -421,48 +851,96 @@ def generate_heatmap_from_gsea_inplace(
                 rscript=settings.rscript_path,
                 analysis_script=analysis_script,
                 job_dir=job_dir,
-                params=temp_params,
-                params_path=job_dir / "logs" / "heatmap_inplace_params.json",
-                log_path=job_dir / "logs" / "heatmap_inplace.log",
+                params=r_params,
+                params_path=job_dir / "logs" / f"{action}_params.json",
+                log_path=job_dir / "logs" / f"{action}.log",
+                executor=executor,
             )
+            finished_at = datetime.now(timezone.utc).isoformat()
+            if rc == 0 and (job_dir / "output" / required_output).exists():
+                done = {"state": "success", "message": messages["success"], "finished_at": finished_at, **info}
+                memo_store(job_dir, action, key, outputs, done)
+            else:
+                done = {"state": "error", "message": messages["error"], "finished_at": finished_at, **info}
+            update_status_fields(status_path, {status_key: done})
         finally:
             # 释放锁（即便失败也释放，允许重试）
-            try:
-                lock_file.unlink(missing_ok=True)
-            except Exception:
-                pass
-
-        # 更新动作状态（不改主状态）
-        st = read_status(status_path)
-        ex = st.get("extra", {}) if isinstance(st.get("extra"), dict) else {}
-        if rc == 0:
-            ex["heatmap_from_gsea"] = {
-                "state": "success",
-                "message": "热图生成完成",
-                "finished_at": datetime.now(timezone.utc).isoformat(),
-                "outputs": ["heatmap.png", "heatmap_genes.csv"],
-            }
-        else:
-            ex["heatmap_from_gsea"] = {
-                "state": "error",
-                "message": "热图生成失败（请查看 logs/heatmap_inplace.log）",
-                "finished_at": datetime.now(timezone.utc).isoformat(),
-            }
-        write_status(
-            status_path,
-            state=st.get("state", "success"),
-            message=st.get("message"),
-            created_at=st.get("created_at"),
-            started_at=st.get("started_at"),
-            finished_at=st.get("finished_at"),
-            extra=ex,
-        )
+            release_action_lock(lock_file, key)
 
     background_tasks.add_task(_run_and_cleanup)
-    
     return JobCreateResponse(job_id=job_id)
 
 
+@app.post("/api/jobs/{job_id}/heatmap_from_gsea_inplace", response_model=JobCreateResponse)
+def generate_heatmap_from_gsea_inplace(
+    job_id: str,
+    background_tasks: BackgroundTasks,
+    pathway_id: str = Form(""),
+    pathway_description: str = Form(""),
+) -> JobCreateResponse:
+    """
+    就地生成热图（不创建新 job）：从父 job 的 GSEA 结果选择通路，
+    在同一 job_dir/output/ 下生成/覆盖 heatmap.png。
+    相同通路的并发请求合并到同一次渲染，已渲染过的通路直接复用结果。
+    """
+    import json
+    from datetime import datetime, timezone
+
+    job_dir = safe_job_dir(settings.jobs_root, job_id)
+
+    # 校验必需文件
+    gsea_results = job_dir / "output" / "gsea_results.csv"
+    gsea_core = job_dir / "output" / "gsea_core_genes.json"
+    if not gsea_results.exists():
+        raise HTTPException(status_code=400, detail="缺少 output/gsea_results.csv")
+    if not gsea_core.exists():
+        raise HTTPException(status_code=400, detail="缺少 output/gsea_core_genes.json")
+
+    if not pathway_id and not pathway_description:
+        raise HTTPException(status_code=400, detail="pathway_id 或 pathway_description 必须提供一个")
+
+    def write_request() -> None:
+        # Only the request holding the lock may record its parameters.
+        heatmap_req = {
+            "job_id": job_id,
+            "pathway_id": pathway_id,
+            "pathway_description": pathway_description,
+            "requested_at": datetime.now(timezone.utc).isoformat(),
+        }
+        req_path = job_dir / "output" / "heatmap_request.json"
+        tmp = req_path.with_name(f".{req_path.name}.tmp")
+        tmp.write_text(json.dumps(heatmap_req, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, req_path)
+
+    return _submit_inplace_action(
+        job_id=job_id,
+        job_dir=job_dir,
+        background_tasks=background_tasks,
+        action="heatmap_inplace",
+        status_key="heatmap_from_gsea",
+        script_name="plot_heatmap_inplace.R",
+        # 用一个临时 params 传给 R（禁止覆盖主 params.json）
+        r_params={
+            "job_id": job_id,
+            "job_dir": str(job_dir),
+            "pathway_id": pathway_id,
+            "pathway_description": pathway_description,
+        },
+        key_params={"pathway_id": pathway_id, "pathway_description": pathway_description},
+        deps=[gsea_results, gsea_core, job_dir / "params.json", job_dir / "cache" / "expr_matrix.json"],
+        outputs=["heatmap.png", "heatmap_genes.csv"],
+        required_output="heatmap.png",
+        info={"outputs": ["heatmap.png", "heatmap_genes.csv"], "pathway_id": pathway_id, "pathway_description": pathway_description},
+        on_acquired=write_request,
+        messages={
+            "busy": "热图正在生成中，请稍后再试",
+            "running": "正在生成热图...",
+            "success": "热图生成完成",
+            "error": "热图生成失败（请查看 logs/heatmap_inplace.log）",
+        },
+    )
+
+
 @app.post("/api/jobs/{job_id}/gsea_single_plot_inplace", response_model=JobCreateResponse)
 def gsea_single_plot_inplace(
     job_id: str,
@@ -474,7 +952,6 @@ def gsea_single_plot_inplace(
     就地生成单通路 GSEA 详细图（plotthis::GSEAPlot）：
     在同一 job_dir/output/ 下生成/覆盖 gsea_pathway_{id}.png，不创建新 job。
     """
-    from datetime import datetime, timezone
     import re
 
     job_dir = safe_job_dir(settings.jobs_root, job_id)
@@ -493,96 +970,34 @@ def gsea_single_plot_inplace(
     if missing:
         raise HTTPException(status_code=400, detail=f"缺少必要文件: {', '.join(missing)}")
 
-    lock_file = job_dir / ".lock_gsea_single"
-    if lock_file.exists():
-        raise HTTPException(status_code=409, detail="单通路 GSEA 图正在生成中，请稍后再试")
-    lock_file.write_text("locked", encoding="utf-8")
-
     safe_id = re.sub(r"[^A-Za-z0-9_-]", "_", pathway_id or pathway_description or "pathway")
     out_name = f"gsea_pathway_{safe_id}.png"
 
-    status_path = job_dir / "status.json"
-    st = read_status(status_path)
-    ex = st.get("extra", {}) if isinstance(st.get("extra"), dict) else {}
-    ex["gsea_single_plot"] = {
-        "state": "running",
-        "message": "正在生成单通路 GSEA 详细图...",
-        "started_at": datetime.now(timezone.utc).isoformat(),
-        "output": out_name,
-        "pathway_id": pathway_id,
-        "pathway_description": pathway_description,
-    }
-    write_status(
-        status_path,
-        state=st.get("state", "success"),
-        message=st.get("message"),
-        created_at=st.get("created_at"),
-        started_at=st.get("started_at"),
-        finished_at=st.get("finished_at"),
-        extra=ex,
+    return _submit_inplace_action(
+        job_id=job_id,
+        job_dir=job_dir,
+        background_tasks=background_tasks,
+        action="gsea_single",
+        status_key="gsea_single_plot",
+        script_name="plot_gsea_single.R",
+        r_params={
+            "job_id": job_id,
+            "pathway_id": pathway_id,
+            "pathway_description": pathway_description,
+        },
+        key_params={"pathway_id": pathway_id, "pathway_description": pathway_description},
+        deps=need,
+        outputs=[out_name],
+        required_output=out_name,
+        info={"output": out_name, "pathway_id": pathway_id, "pathway_description": pathway_description},
+        messages={
+            "busy": "单通路 GSEA 图正在生成中，请稍后再试",
+            "running": "正在生成单通路 GSEA 详细图...",
+            "success": "单通路 GSEA 图生成完成",
+            "error": "单通路 GSEA 图生成失败（请查看 logs/gsea_single.log）",
+        },
     )
 
-    analysis_script = settings.project_root / "analysis" / "plot_gsea_single.R"
-    if not analysis_script.exists():
-        lock_file.unlink(missing_ok=True)
-        raise HTTPException(status_code=500, detail=f"analysis script not found: {analysis_script}")
-
-    params = {
-        "job_id": job_id,
-        "pathway_id": pathway_id,
-        "pathway_description": pathway_description,
-    }
-
-    def _run_and_cleanup() -> None:
-        rc = 1
-        try:
-            rc = run_r_action(
-                rscript=settings.rscript_path,
-                analysis_script=analysis_script,
-                job_dir=job_dir,
-                params=params,
-                params_path=job_dir / "logs" / "gsea_single_params.json",
-                log_path=job_dir / "logs" / "gsea_single.log",
-            )
-        finally:
-            try:
-                lock_file.unlink(missing_ok=True)
-            except Exception:
-                pass
-
-        st2 = read_status(status_path)
-        ex2 = st2.get("extra", {}) if isinstance(st2.get("extra"), dict) else {}
-        if rc == 0 and (job_dir / "output" / out_name).exists():
-            ex2["gsea_single_plot"] = {
-                "state": "success",
-                "message": "单通路 GSEA 图生成完成",
-                "finished_at": datetime.now(timezone.utc).isoformat(),
-                "output": out_name,
-                "pathway_id": pathway_id,
-                "pathway_description": pathway_description,
-            }
-        else:
-            ex2["gsea_single_plot"] = {
-                "state": "error",
-                "message": "单通路 GSEA 图生成失败（请查看 logs/gsea_single.log）",
-                "finished_at": datetime.now(timezone.utc).isoformat(),
-                "output": out_name,
-                "pathway_id": pathway_id,
-                "pathway_description": pathway_description,
-            }
-        write_status(
-            status_path,
-            state=st2.get("state", "success"),
-            message=st2.get("message"),
-            created_at=st2.get("created_at"),
-            started_at=st2.get("started_at"),
-            finished_at=st2.get("finished_at"),
-            extra=ex2,
-        )
-
-    background_tasks.add_task(_run_and_cleanup)
-    return JobCreateResponse(job_id=job_id)
-
 
 @app.post("/api/jobs/{job_id}/volcano_inplace", response_model=JobCreateResponse)
 def volcano_inplace(
@@ -595,94 +1010,36 @@ def volcano_inplace(
     就地生成火山图增强版（TopN + 标记基因）：不创建新 job，
     在同一 job_dir/output/ 下生成 volcano_custom.png 等文件。
     """
-    from datetime import datetime, timezone
-
     job_dir = safe_job_dir(settings.jobs_root, job_id)
     in_csv = job_dir / "output" / "deseq2_results.csv"
     if not in_csv.exists():
         raise HTTPException(status_code=400, detail="缺少 output/deseq2_results.csv（请先完成 DESeq2）")
 
-    lock_file = job_dir / ".lock_volcano_inplace"
-    if lock_file.exists():
-        raise HTTPException(status_code=409, detail="火山图正在生成中，请稍后再试")
-    lock_file.write_text("locked", encoding="utf-8")
-
-    status_path = job_dir / "status.json"
-    st = read_status(status_path)
-    ex = st.get("extra", {}) if isinstance(st.get("extra"), dict) else {}
-    ex["volcano_inplace"] = {
-        "state": "running",
-        "message": "正在生成火山图...",
-        "started_at": datetime.now(timezone.utc).isoformat(),
-        "outputs": ["volcano_custom.png"],
-        "top_n": int(top_n),
-        "mark_genes": mark_genes,
-    }
-    write_status(
-        status_path,
-        state=st.get("state", "success"),
-        message=st.get("message"),
-        created_at=st.get("created_at"),
-        started_at=st.get("started_at"),
-        finished_at=st.get("finished_at"),
-        extra=ex,
+    return _submit_inplace_action(
+        job_id=job_id,
+        job_dir=job_dir,
+        background_tasks=background_tasks,
+        action="volcano_inplace",
+        status_key="volcano_inplace",
+        script_name="plot_volcano_inplace.R",
+        r_params={"job_id": job_id, "top_n": int(top_n), "mark_genes": mark_genes},
+        key_params={"top_n": int(top_n), "mark_genes": mark_genes},
+        deps=[in_csv, job_dir / "params.json"],
+        outputs=["volcano_custom.png", "volcano_custom_top_genes.csv", "volcano_custom_marked_genes.csv"],
+        required_output="volcano_custom.png",
+        info={
+            "outputs": ["volcano_custom.png", "volcano_custom_top_genes.csv", "volcano_custom_marked_genes.csv"],
+            "top_n": int(top_n),
+            "mark_genes": mark_genes,
+        },
+        messages={
+            "busy": "火山图正在生成中，请稍后再试",
+            "running": "正在生成火山图...",
+            "success": "火山图生成完成",
+            "error": "火山图生成失败（请查看 logs/volcano_inplace.log）",
+        },
     )
 
-    analysis_script = settings.project_root / "analysis" / "plot_volcano_inplace.R"
-    if not analysis_script.exists():
-        lock_file.unlink(missing_ok=True)
-        raise HTTPException(status_code=500, detail=f"analysis script not found: {analysis_script}")
-
-    params = {"job_id": job_id, "top_n": int(top_n), "mark_genes": mark_genes}
-
-    def _run_and_cleanup() -> None:
-        rc = 1
-        try:
-            rc = run_r_action(
-                rscript=settings.rscript_path,
-                analysis_script=analysis_script,
-                job_dir=job_dir,
-                params=params,
-                params_path=job_dir / "logs" / "volcano_inplace_params.json",
-                log_path=job_dir / "logs" / "volcano_inplace.log",
-            )
-        finally:
-            try:
-                lock_file.unlink(missing_ok=True)
-            except Exception:
-                pass
-
-        st2 = read_status(status_path)
-        ex2 = st2.get("extra", {}) if isinstance(st2.get("extra"), dict) else {}
-        if rc == 0 and (job_dir / "output" / "volcano_custom.png").exists():
-            ex2["volcano_inplace"] = {
-                "state": "success",
-                "message": "火山图生成完成",
-                "finished_at": datetime.now(timezone.utc).isoformat(),
-                "outputs": ["volcano_custom.png", "volcano_custom_top_genes.csv", "volcano_custom_marked_genes.csv"],
-                "top_n": int(top_n),
-            }
-        else:
-            ex2["volcano_inplace"] = {
-                "state": "error",
-                "message": "火山图生成失败（请查看 logs/volcano_inplace.log）",
-                "finished_at": datetime.now(timezone.utc).isoformat(),
-                "outputs": ["volcano_custom.png"],
-                "top_n": int(top_n),
-            }
-        write_status(
-            status_path,
-            state=st2.get("state", "success"),
-            message=st2.get("message"),
-            created_at=st2.get("created_at"),
-            started_at=st2.get("started_at"),
-            finished_at=st2.get("finished_at"),
-            extra=ex2,
-        )
-
-    background_tasks.add_task(_run_and_cleanup)
-    return JobCreateResponse(job_id=job_id)
-
 
 @app.get("/api/jobs/{job_id}/log")
 def get_job_log(job_id: str) -> FileResponse:
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+
+PCA_COMPONENTS_NAME = "pca_components.json"
+
+
+@lru_cache(maxsize=32)
+def _load_components(path_str: str, mtime_ns: int) -> dict[str, Any]:
+    # mtime_ns is part of the cache key so a re-run of the PCA stage is picked up.
+    return json.loads(Path(path_str).read_text(encoding="utf-8"))
+
+
+def load_pca_components(job_dir: Path) -> dict[str, Any] | None:
+    path = job_dir / "output" / PCA_COMPONENTS_NAME
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _load_components(str(path), mtime_ns)
+
+
+def parse_pcs(pcs: str, available: list[str]) -> tuple[int, int]:
+    """Parse "1,2" / "PC1,PC3" into zero-based column indexes of the scores matrix."""
+    parts = [p.strip().upper().removeprefix("PC") for p in pcs.split(",") if p.strip()]
+    if len(parts) != 2 or not all(p.isdigit() for p in parts):
+        raise ValueError("pcs must look like 1,2 or PC1,PC2")
+    idx = (int(parts[0]) - 1, int(parts[1]) - 1)
+    for i in idx:
+        if i < 0 or i >= len(available):
+            raise ValueError(f"pcs out of range: only {len(available)} components were computed")
+    return idx
+
+
+def select_pca_view(components: dict[str, Any], *, pcs: str, color: str) -> dict[str, Any]:
+    available = list(components.get("pcs") or [])
+    ix, iy = parse_pcs(pcs, available)
+
+    metadata = components.get("metadata")
+    metadata = metadata if isinstance(metadata, dict) else {}
+    color_vars = list(metadata.keys())
+    if color and color not in metadata:
+        raise ValueError(f"unknown color variable: {color}")
+    color_var = color or (color_vars[0] if color_vars else "")
+    color_values = metadata.get(color_var) or []
+
+    samples = components.get("samples") or []
+    scores = components.get("scores") or []
+    variance = components.get("variance_explained") or []
+    points = [
+        {
+            "sample": sample,
+            "x": row[ix],
+            "y": row[iy],
+            "color": color_values[i] if i < len(color_values) else None,
+        }
+        for i, (sample, row) in enumerate(zip(samples, scores))
+    ]
+    return {
+        "pcs": [available[ix], available[iy]],
+        "variance_explained": [variance[ix], variance[iy]],
+        "color_var": color_var,
+        "color_vars": color_vars,
+        "available_pcs": available,
+        "n_top_genes": components.get("n_top_genes"),
+        "points": points,
+    }
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import re
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from .config import Settings
+
+
+# Loaded unconditionally by analysis/lib.R: without them no job can run.
+CORE_PACKAGES = ("jsonlite", "dplyr", "tidyr", "tibble", "ggplot2", "DESeq2", "ComplexHeatmap", "circlize")
+OPTIONAL_PACKAGES = ("clusterProfiler", "GSVA", "decoupleR", "OmnipathR", "Matrix", "plotthis", "ggrepel", "arrow")
+
+# Packages each optional module of run_job.R stops on (see the requireNamespace checks in lib.R).
+MODULE_PACKAGES: dict[str, tuple[str, ...]] = {
+    "gsea": ("clusterProfiler",),
+    "gsva": ("GSVA",),
+    "tf": ("decoupleR", "OmnipathR", "Matrix"),
+}
+# In-place / derived scripts that cannot fall back without a package.
+SCRIPT_PACKAGES: dict[str, tuple[str, ...]] = {
+    "plot_gsea_single.R": ("plotthis",),
+}
+
+PROBE_TIMEOUT_SECONDS = 60
+# Same defaults as resolve_msigdb_gmt() in analysis/lib.R.
+DEFAULT_GMT = {"human": "h.all.v2025.1.Hs.symbols.gmt", "mouse": "mh.all.v2025.1.Mm.symbols.gmt"}
+
+_PROBE_SCRIPT = (
+    "cat('R\\t', R.version$major, '.', R.version$minor, '\\n', sep = '');"
+    "for (p in commandArgs(trailingOnly = TRUE)) "
+    "cat(p, '\\t', tryCatch(as.character(utils::packageVersion(p)), error = function(e) ''), '\\n', sep = '')"
+)
+_TF_CACHE_RE = re.compile(r"^(collectri|dorothea)_(human|mouse)(?:_([A-D]+))?\.rds$")
+
+
+class AdmissionError(Exception):
+    """A request needs R packages the probed environment lacks (maps to HTTP 503)."""
+
+
+def probe_r_packages(rscript: str, packages: tuple[str, ...]) -> dict[str, Any]:
+    """Installed versions via utils::packageVersion (no namespace is loaded, so this takes ~1s)."""
+    try:
+        proc = subprocess.run(
+            [rscript, "--vanilla", "-e", _PROBE_SCRIPT, *packages],
+            capture_output=True,
+            text=True,
+            timeout=PROBE_TIMEOUT_SECONDS,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}", "r_version": None, "packages": {}}
+    versions: dict[str, str | None] = {p: None for p in packages}
+    r_version = None
+    for line in proc.stdout.splitlines():
+        name, _, version = line.partition("\t")
+        if name == "R":
+            r_version = version.strip() or None
+        elif name in versions:
+            versions[name] = version.strip() or None
+    if proc.returncode != 0:
+        return {"ok": False, "error": proc.stderr.strip()[-500:], "r_version": r_version, "packages": versions}
+    return {"ok": True, "error": None, "r_version": r_version, "packages": versions}
+
+
+def scan_tf_caches(cache_dir: Path) -> dict[str, Any]:
+    networks: dict[str, dict[str, list[str] | bool]] = {"collectri": {}, "dorothea": {}}
+    indexed: list[str] = []
+    if cache_dir.is_dir():
+        for p in sorted(cache_dir.glob("*.rds")):
+            m = _TF_CACHE_RE.match(p.name)
+            if not m:
+                continue
+            database, organism, levels = m.groups()
+            if database == "collectri":
+                networks["collectri"][organism] = True
+            else:
+                networks["dorothea"].setdefault(organism, []).append(levels or "")
+        indexed = sorted(p.name for p in (cache_dir / "tf_index").glob("*.index.rds"))
+    return {"cache_dir": str(cache_dir), "networks": networks, "indexed": indexed}
+
+
+def scan_msigdb(msigdb_dir: Path) -> dict[str, list[str]]:
+    return {
+        species: sorted(p.name for p in (msigdb_dir / species).glob("*.gmt") if p.is_file())
+        for species in ("human", "mouse")
+    }
+
+
+class RProbe:
+    """
+    Cached snapshot of what the configured Rscript can run. The package probe
+    starts an R process, so it runs once in the background and is refreshed
+    when older than ttl_seconds; callers always get the last snapshot without
+    waiting (None until the first probe finishes). Cache and MSigDB listings
+    are cheap directory scans and are refreshed together with it.
+    """
+
+    def __init__(self, settings: Settings, ttl_seconds: int = 600) -> None:
+        self.settings = settings
+        self.ttl_seconds = ttl_seconds
+        self._snapshot: dict[str, Any] | None = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _probe(self) -> dict[str, Any]:
+        r = probe_r_packages(self.settings.rscript_path, CORE_PACKAGES + OPTIONAL_PACKAGES)
+        packages = r["packages"]
+        missing_core = [p for p in CORE_PACKAGES if not packages.get(p)]
+        modules = {name: all(packages.get(p) for p in pkgs) for name, pkgs in MODULE_PACKAGES.items()}
+        return {
+            "probed_at": time.time(),
+            "rscript": self.settings.rscript_path,
+            "rscript_ok": r["ok"],
+            "error": r["error"],
+            "r_version": r["r_version"],
+            "packages": packages,
+            "missing_core": missing_core,
+            "modules": {"core": r["ok"] and not missing_core, **modules},
+            "tf_caches": scan_tf_caches(self.settings.cache_dir),
+            "msigdb": scan_msigdb(self.settings.msigdb_dir),
+        }
+
+    def refresh(self) -> dict[str, Any]:
+        snapshot = self._probe()
+        with self._lock:
+            self._snapshot = snapshot
+            self._refreshing = False
+        return snapshot
+
+    def refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run() -> None:
+            try:
+                self.refresh()
+            except Exception:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="r-probe", daemon=True).start()
+
+    def snapshot(self) -> dict[str, Any] | None:
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is None or time.time() - snapshot["probed_at"] > self.ttl_seconds:
+            self.refresh_in_background()
+        return snapshot
+
+
+def admit_modules(snapshot: dict[str, Any] | None, modules: dict[str, bool]) -> tuple[dict[str, bool], list[str]]:
+    """
+    Check a job's module switches against the probe. Missing core packages
+    reject the job; optional modules whose packages are missing are switched
+    off and reported as warnings so the rest of the job still runs. Without a
+    snapshot yet (first probe still running) everything is admitted.
+    """
+    if snapshot is None:
+        return modules, []
+    if not snapshot["rscript_ok"]:
+        raise AdmissionError(f"Rscript 不可用: {snapshot['rscript']} ({snapshot['error']})")
+    if snapshot["missing_core"]:
+        raise AdmissionError(f"R 环境缺少必需的包: {', '.join(snapshot['missing_core'])}")
+
+    admitted = dict(modules)
+    warnings: list[str] = []
+    for name, pkgs in MODULE_PACKAGES.items():
+        if not admitted.get(name):
+            continue
+        missing = [p for p in pkgs if not snapshot["packages"].get(p)]
+        if missing:
+            admitted[name] = False
+            warnings.append(f"已跳过 {name}: R 环境缺少 {', '.join(missing)}")
+    return admitted, warnings
+
+
+def require_script_packages(snapshot: dict[str, Any] | None, script_name: str) -> None:
+    if snapshot is None:
+        return
+    if not snapshot["rscript_ok"]:
+        raise AdmissionError(f"Rscript 不可用: {snapshot['rscript']} ({snapshot['error']})")
+    missing = [p for p in SCRIPT_PACKAGES.get(script_name, ()) if not snapshot["packages"].get(p)]
+    if missing:
+        raise AdmissionError(f"R 环境缺少 {', '.join(missing)}，无法运行 {script_name}")
+
+
+def admit_genesets(snapshot: dict[str, Any] | None, species: str, gmt_file: str) -> str | None:
+    """Reason the GMT file the GSEA/GSVA modules would read is missing locally, or None."""
+    if snapshot is None:
+        return None
+    name = gmt_file or DEFAULT_GMT[species]
+    if name not in snapshot["msigdb"].get(species, []):
+        return f"本地 MSigDB 缺少 {species}/{name}"
+    return None
+
+
+def tf_network_available(snapshot: dict[str, Any] | None, database: str, organism: str, levels: list[str]) -> bool:
+    """Whether the TF network is cached locally (otherwise OmnipathR has to download it at run time)."""
+    if snapshot is None:
+        return True
+    networks = snapshot["tf_caches"]["networks"]
+    if database == "collectri":
+        return bool(networks["collectri"].get(organism))
+    return "".join(sorted(levels)) in (networks["dorothea"].get(organism) or [])
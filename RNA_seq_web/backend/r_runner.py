@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 import json
-import subprocess
 from pathlib import Path
 from typing import Any
 
+from .executor import Executor, LocalExecutor, RTask
+from .tracing import current_trace_id, span
+
 
 def launch_r_job(
     *,
@@ -13,41 +15,29 @@ def launch_r_job(
     job_dir: Path,
     params: dict[str, Any],
     log_path: Path,
+    executor: Executor | None = None,
 ) -> None:
     """
-    Fire-and-forget: starts an Rscript subprocess and returns immediately.
+    Fire-and-forget: hands an Rscript run to the executor and returns immediately.
     The R script is responsible for updating status.json in job_dir.
     """
     analysis_script = analysis_script.resolve()
     job_dir = job_dir.resolve()
 
+    # The R side records its stage spans under the same trace id (logs/trace.jsonl).
+    params = {**params, "trace_id": params.get("trace_id") or current_trace_id()}
     params_json = job_dir / "params.json"
     params_json.write_text(json.dumps(params, ensure_ascii=False, indent=2), encoding="utf-8")
 
-    log_path.parent.mkdir(parents=True, exist_ok=True)
-    log_f = log_path.open("ab", buffering=0)
-
-    try:
-        subprocess.Popen(
-            [
-                rscript,
-                str(analysis_script),
-                "--job_dir",
-                str(job_dir),
-                "--params",
-                str(params_json),
-            ],
-            stdout=log_f,
-            stderr=subprocess.STDOUT,
-            cwd=str(job_dir),
-            close_fds=True,
-        )
-    finally:
-        # Child inherits the fd; we can close our reference.
-        try:
-            log_f.close()
-        except Exception:
-            pass
+    task = RTask.new(
+        rscript=rscript,
+        analysis_script=analysis_script,
+        job_dir=job_dir,
+        params_path=params_json,
+        log_path=log_path.resolve(),
+    )
+    with span("r.submit", script=analysis_script.name, task_id=task.task_id):
+        (executor or LocalExecutor()).submit(task)
 
 
 def run_r_action(
@@ -58,9 +48,10 @@ def run_r_action(
     params: dict[str, Any],
     params_path: Path,
     log_path: Path,
+    executor: Executor | None = None,
 ) -> int:
     """
-    Run-and-wait: runs an Rscript subprocess and waits until it finishes.
+    Run-and-wait: runs an Rscript through the executor and waits until it finishes.
 
     Unlike launch_r_job(), this will NOT overwrite job_dir/params.json.
     It writes params to the given params_path, and passes it via --params.
@@ -69,24 +60,18 @@ def run_r_action(
     job_dir = job_dir.resolve()
     params_path = params_path.resolve()
 
+    params = {**params, "trace_id": params.get("trace_id") or current_trace_id()}
     params_path.parent.mkdir(parents=True, exist_ok=True)
     params_path.write_text(json.dumps(params, ensure_ascii=False, indent=2), encoding="utf-8")
 
-    log_path.parent.mkdir(parents=True, exist_ok=True)
-    with log_path.open("ab", buffering=0) as log_f:
-        proc = subprocess.run(
-            [
-                rscript,
-                str(analysis_script),
-                "--job_dir",
-                str(job_dir),
-                "--params",
-                str(params_path),
-            ],
-            stdout=log_f,
-            stderr=subprocess.STDOUT,
-            cwd=str(job_dir),
-            close_fds=True,
-        )
-        return int(proc.returncode)
-
+    task = RTask.new(
+        rscript=rscript,
+        analysis_script=analysis_script,
+        job_dir=job_dir,
+        params_path=params_path,
+        log_path=log_path.resolve(),
+    )
+    with span("r.run", script=analysis_script.name, task_id=task.task_id) as attrs:
+        rc = (executor or LocalExecutor()).run(task)
+        attrs["returncode"] = rc
+    return rc
@@ -11,12 +11,15 @@ JobState = Literal["queued", "running", "success", "error"]
 
 class JobCreateResponse(BaseModel):
     job_id: str
+    # modules switched off at admission because the R environment lacks them
+    warnings: list[str] = Field(default_factory=list)
 
 
 class JobOutputItem(BaseModel):
     name: str
     url: str
     size_bytes: int = 0
+    thumb_url: str | None = None
 
 
 class JobStatusResponse(BaseModel):
@@ -29,3 +32,39 @@ class JobStatusResponse(BaseModel):
     outputs: list[JobOutputItem] = Field(default_factory=list)
     extra: dict[str, Any] | None = None
 
+
+
+class CompareRequest(BaseModel):
+    job_ids: list[str]
+    direction: Literal["up", "down", "all"] = "all"
+    max_genes: int = Field(200, ge=0, le=5000)
+
+
+class JobParamSet(BaseModel):
+    """One job's analysis parameters; the same fields and defaults as the POST /api/jobs form."""
+
+    min_count_filter: int = 10
+    design_var: str = ""
+    contrast_num: str = ""
+    contrast_denom: str = ""
+    padj_threshold: float = 0.05
+    lfc_threshold: float = 1.0
+    run_pca: bool = True
+    run_deseq2: bool = True
+    run_gsea: bool = True
+    run_gsva: bool = False
+    run_tf: bool = False
+    run_heatmap: bool = False
+    species: str = "human"
+    gmt_file: str = ""
+    heatmap_genes: str = ""
+    tf_database: str = "collectri"
+    tf_method: str = "ulm"
+    tf_dorothea_levels: str = "A,B,C"
+    gsea_progressive: bool = True
+
+
+class JobBatchResponse(BaseModel):
+    counts_blob: str
+    metadata_blob: str
+    jobs: list[JobCreateResponse] = Field(default_factory=list)
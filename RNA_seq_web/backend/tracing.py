@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import atexit
+import json
+import queue
+import re
+import threading
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator
+
+
+TRACE_HEADER = "x-trace-id"
+TRACE_FILE_NAME = "api.jsonl"
+_TRACE_ID_RE = re.compile(r"^[0-9a-f]{16,32}$")
+
+_trace_id: ContextVar[str] = ContextVar("trace_id", default="")
+_span_id: ContextVar[str] = ContextVar("span_id", default="")
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def current_trace_id() -> str:
+    return _trace_id.get()
+
+
+class TraceWriter:
+    """
+    Buffered JSONL span sink. emit() only enqueues (dropping when the buffer is
+    full), so request handlers never touch the disk; a daemon thread batches
+    records to trace_dir/api.jsonl and rotates it by size. A batch is written
+    as soon as it reaches batch_size records or flush_seconds after its first
+    record, whichever comes first; close() (called from the app lifespan, and
+    at interpreter exit as a backstop) drains what is left.
+
+    Sampling is decided per trace id, so a sampled request keeps all of its
+    spans. Error spans are always written.
+    """
+
+    def __init__(
+        self,
+        trace_dir: Path,
+        *,
+        sample_rate: float = 0.1,
+        max_bytes: int = 20 * 1024 * 1024,
+        backups: int = 5,
+        buffer_size: int = 10000,
+        batch_size: int = 500,
+        flush_seconds: float = 1.0,
+    ) -> None:
+        self.path = trace_dir / TRACE_FILE_NAME
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.dropped = 0
+        self._closed = False
+        self._queue: queue.Queue[dict[str, Any] | None] = queue.Queue(maxsize=buffer_size)
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def sampled(self, trace_id: str) -> bool:
+        if self.sample_rate >= 1.0:
+            return True
+        if self.sample_rate <= 0.0 or not trace_id:
+            return False
+        return zlib.crc32(trace_id.encode("ascii", "ignore")) / 0xFFFFFFFF < self.sample_rate
+
+    def emit(self, record: dict[str, Any]) -> None:
+        if record.get("status") != "error" and not self.sampled(str(record.get("trace_id") or "")):
+            return
+        self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self) -> None:
+        if self._thread is not None or self._closed:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = time.monotonic() + self.flush_seconds
+            while first is not None and len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                if item is None:
+                    break
+            records = [r for r in batch if r is not None]
+            if records:
+                try:
+                    self._write(records)
+                except OSError:
+                    self.dropped += len(records)
+            if None in batch:
+                return
+
+    def _write(self, records: list[dict[str, Any]]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if self.path.stat().st_size >= self.max_bytes:
+                self._rotate()
+        except FileNotFoundError:
+            pass
+        data = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(data)
+
+    def _rotate(self) -> None:
+        for i in range(self.backups - 1, 0, -1):
+            src = self.path.with_name(f"{self.path.name}.{i}")
+            if src.exists():
+                src.replace(self.path.with_name(f"{self.path.name}.{i + 1}"))
+        self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._thread is None or self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+_writer: TraceWriter | None = None
+
+
+def configure_tracing(writer: TraceWriter | None) -> None:
+    global _writer
+    _writer = writer
+
+
+def _utc_iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def _record(name: str, started: float, duration: float, status: str, span_id: str, parent_id: str, attrs: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "ts": _utc_iso(started),
+        "trace_id": _trace_id.get(),
+        "span_id": span_id,
+        "parent_id": parent_id or None,
+        "name": name,
+        "duration_ms": round(duration * 1000, 3),
+        "status": status,
+        "source": "api",
+        "attrs": attrs,
+    }
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[dict[str, Any]]:
+    """
+    Time a backend step under the current trace. The yielded dict can be
+    filled with more attributes while the span is open.
+    """
+    if _writer is None or not _trace_id.get():
+        yield attrs
+        return
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = _span_id.get()
+    token = _span_id.set(span_id)
+    started = time.time()
+    t0 = time.perf_counter()
+    status = "ok"
+    try:
+        yield attrs
+    except BaseException as e:
+        status = "error"
+        attrs.setdefault("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _span_id.reset(token)
+        _writer.emit(_record(name, started, time.perf_counter() - t0, status, span_id, parent_id, attrs))
+
+
+class TraceMiddleware:
+    """
+    Pure ASGI middleware: assigns each request a trace id (honouring a valid
+    incoming X-Trace-Id), echoes it in the response and records one span per
+    request when the response is sent. Being plain ASGI, the context variable is
+    visible to the endpoint and to its background tasks.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = ""
+        for k, v in scope.get("headers") or []:
+            if k == TRACE_HEADER.encode("ascii"):
+                incoming = v.decode("latin-1").strip().lower()
+                break
+        trace_id = incoming if _TRACE_ID_RE.match(incoming) else new_trace_id()
+        span_id = uuid.uuid4().hex[:16]
+        trace_token = _trace_id.set(trace_id)
+        span_token = _span_id.set(span_id)
+        started = time.time()
+        t0 = time.perf_counter()
+        status_code = 500
+        done = False
+
+        def finish(status: str) -> None:
+            nonlocal done
+            if done or _writer is None:
+                return
+            done = True
+            route = scope.get("route")
+            attrs = {
+                "method": scope.get("method"),
+                "path": getattr(route, "path", None) or scope.get("path"),
+                "status_code": status_code,
+            }
+            _writer.emit(_record("http", started, time.perf_counter() - t0, status, span_id, "", attrs))
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = int(message["status"])
+                message["headers"] = [*message.get("headers", []), (TRACE_HEADER.encode("ascii"), trace_id.encode("ascii"))]
+            await send(message)
+            # Close the request span when the body is sent, before any background tasks run.
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish("error" if status_code >= 500 else "ok")
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            finish("error")
+            raise
+        finally:
+            _span_id.reset(span_token)
+            _trace_id.reset(trace_token)
@@ -0,0 +1,217 @@
+"""
+Spool worker daemon: `python -m backend.worker [--worker-id ID] [--concurrency N]`.
+
+Run one or more of these on every compute node that mounts the shared
+var/jobs and spool directories, with RNA_SEQ_WEB_EXECUTOR=spool set for the
+API process. Each worker claims queued R tasks, keeps a heartbeat lease while
+the Rscript runs, and re-queues tasks whose owner's lease has expired. A worker
+whose claim was re-queued stops its Rscript and discards the result.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+import uuid
+from dataclasses import asdict, replace
+from pathlib import Path
+from typing import Any
+
+from .config import Settings, get_settings
+from .executor import WORKER_ID_ENV, RTask, SpoolDirs, claim_task_id, write_json_atomic
+
+
+def _read_json(path: Path) -> dict[str, Any] | None:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class SpoolWorker:
+    def __init__(self, settings: Settings, worker_id: str, poll_seconds: float = 1.0) -> None:
+        self.settings = settings
+        self.worker_id = worker_id
+        self.dirs = SpoolDirs(settings.spool_dir)
+        self.dirs.ensure()
+        self.lease_seconds = settings.lease_seconds
+        self.poll_seconds = poll_seconds
+
+    # -- leases -----------------------------------------------------------
+
+    def _write_lease(self, claimed: Path) -> None:
+        write_json_atomic(
+            self.dirs.leases / claimed.name,
+            {"worker_id": self.worker_id, "pid": os.getpid(), "heartbeat_at": time.time()},
+        )
+
+    def requeue_expired(self) -> int:
+        """Move claimed tasks whose lease heartbeat is older than the lease period back to queue/."""
+        now = time.time()
+        requeued = 0
+        for claimed in self.dirs.claimed.glob("*.json"):
+            lease_path = self.dirs.leases / claimed.name
+            lease = _read_json(lease_path)
+            if lease is not None:
+                last = float(lease.get("heartbeat_at", 0))
+            else:
+                # Claimed but lease not written yet (or lost): fall back to the claim time.
+                try:
+                    last = claimed.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+            if now - last <= self.lease_seconds:
+                continue
+            # Take the expired claim private first: only one worker's rename succeeds,
+            # and the owner's token-named claim is gone before the task reappears.
+            taken = claimed.with_name(f"{claimed.name}.{uuid.uuid4().hex[:8]}.requeue")
+            try:
+                os.rename(claimed, taken)
+            except FileNotFoundError:
+                continue  # another worker re-queued it, or the owner finished it first
+            lease_path.unlink(missing_ok=True)
+            data = _read_json(taken)
+            if data is not None:
+                task = RTask(**data)
+                write_json_atomic(self.dirs.queue / f"{task.task_id}.json", asdict(replace(task, attempt=task.attempt + 1)))
+            taken.unlink(missing_ok=True)
+            requeued += 1
+            print(f"[{self.worker_id}] re-queued {claim_task_id(claimed)} (lease owner {lease and lease.get('worker_id')})", flush=True)
+        # Leases whose claim is gone (written by a heartbeat racing a re-queue)
+        for lease_path in self.dirs.leases.glob("*.json"):
+            if not (self.dirs.claimed / lease_path.name).exists():
+                try:
+                    if now - lease_path.stat().st_mtime > self.lease_seconds:
+                        lease_path.unlink(missing_ok=True)
+                except FileNotFoundError:
+                    pass
+        return requeued
+
+    # -- claim / run ------------------------------------------------------
+
+    def claim(self) -> tuple[RTask, Path] | None:
+        for queued in sorted(self.dirs.queue.glob("*.json")):
+            data = _read_json(queued)
+            if data is None:
+                continue  # being rewritten, or already taken
+            claimed = self.dirs.claim_path(queued.stem, self.worker_id, int(data.get("attempt", 0)))
+            try:
+                os.rename(queued, claimed)
+            except FileNotFoundError:
+                continue  # lost the race to another worker
+            # rename keeps the enqueue mtime; touch so the claim time is fresh until the lease exists
+            os.utime(claimed)
+            self._write_lease(claimed)
+            data = _read_json(claimed)
+            if data is None:
+                claimed.unlink(missing_ok=True)
+                (self.dirs.leases / claimed.name).unlink(missing_ok=True)
+                continue
+            return RTask(**data), claimed
+        return None
+
+    def execute(self, task: RTask, claimed: Path) -> int:
+        stop = threading.Event()
+        lost = threading.Event()
+        proc: subprocess.Popen | None = None
+
+        def heartbeat() -> None:
+            while not stop.wait(max(1.0, self.lease_seconds / 3)):
+                # The claim path carries this worker's token: if it is gone the task
+                # was re-queued (or abandoned) and another claim may be running it.
+                if not claimed.exists():
+                    lost.set()
+                    if proc is not None and proc.poll() is None:
+                        proc.terminate()
+                    return
+                self._write_lease(claimed)
+
+        hb = threading.Thread(target=heartbeat, name=f"lease-{task.task_id}", daemon=True)
+        hb.start()
+
+        # Prefer this node's Rscript and analysis/ checkout; job paths are shared.
+        analysis_script = self.settings.project_root / "analysis" / Path(task.analysis_script).name
+        env = dict(os.environ)
+        env[WORKER_ID_ENV] = self.worker_id
+        log_path = Path(task.log_path)
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        print(f"[{self.worker_id}] running {task.task_id} (attempt {task.attempt}): {analysis_script.name} {task.job_dir}", flush=True)
+        try:
+            with log_path.open("ab", buffering=0) as log_f:
+                proc = subprocess.Popen(
+                    task.command(rscript=self.settings.rscript_path, analysis_script=str(analysis_script)),
+                    stdout=log_f,
+                    stderr=subprocess.STDOUT,
+                    cwd=task.job_dir,
+                    close_fds=True,
+                    env=env,
+                )
+                rc = proc.wait()
+        except OSError as e:
+            print(f"[{self.worker_id}] failed to start {task.task_id}: {e}", flush=True)
+            rc = 127
+        finally:
+            stop.set()
+            hb.join()
+
+        # Fence completion on our own claim: taking it private is atomic against a re-queue.
+        finishing = claimed.with_name(f"{claimed.name}.finishing")
+        try:
+            os.rename(claimed, finishing)
+        except FileNotFoundError:
+            lost.set()
+        if lost.is_set():
+            (self.dirs.leases / claimed.name).unlink(missing_ok=True)
+            print(f"[{self.worker_id}] lost claim on {task.task_id} (re-queued elsewhere); result discarded", flush=True)
+            return int(rc)
+
+        if task.notify_done:
+            write_json_atomic(
+                self.dirs.done / f"{task.task_id}.json",
+                {"returncode": int(rc), "worker_id": self.worker_id, "attempt": task.attempt, "finished_at": time.time()},
+            )
+        finishing.unlink(missing_ok=True)
+        (self.dirs.leases / claimed.name).unlink(missing_ok=True)
+        print(f"[{self.worker_id}] finished {task.task_id} rc={rc}", flush=True)
+        return int(rc)
+
+    def serve(self, concurrency: int = 1) -> None:
+        slots = threading.Semaphore(concurrency)
+        print(f"[{self.worker_id}] polling {self.dirs.root} (concurrency={concurrency}, lease={self.lease_seconds}s)", flush=True)
+        while True:
+            self.requeue_expired()
+            if not slots.acquire(timeout=self.poll_seconds):
+                continue
+            claimed = self.claim()
+            if claimed is None:
+                slots.release()
+                time.sleep(self.poll_seconds)
+                continue
+
+            def run(task: RTask = claimed[0], path: Path = claimed[1]) -> None:
+                try:
+                    self.execute(task, path)
+                finally:
+                    slots.release()
+
+            threading.Thread(target=run, name=f"task-{claimed[0].task_id}", daemon=True).start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="RNA_seq_web spool worker")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}:{os.getpid()}")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--poll-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    SpoolWorker(get_settings(), args.worker_id, poll_seconds=args.poll_seconds).serve(concurrency=max(1, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,24 +7,6 @@ const state = {
   workflowStep: 0, // 0=submit, 1=waiting, 2=gsea, 3=downstream
 };
 
-// #region agent log (debug-session helpers)
-const __dbgRunId = (window.__rnaSeqDbgRunId ||= `run-${Math.random().toString(16).slice(2)}`);
-function __dbg(hypothesisId, location, message, data) {
-  fetch('http://127.0.0.1:7242/ingest/f5a316e9-b6a8-4c5b-98ab-77cb40ba3b8d', {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({
-      sessionId: 'debug-session',
-      runId: __dbgRunId,
-      hypothesisId,
-      location,
-      message,
-      data,
-      timestamp: Date.now(),
-    }),
-  }).catch(() => {});
-}
-// #endregion
 
 // 保存状态到 localStorage
 function saveState() {
@@ -192,9 +174,6 @@ function stopPolling() {
   if (pollTimer) {
     clearInterval(pollTimer);
     pollTimer = null;
-    // #region agent log
-    __dbg('G', 'frontend/app.js:stopPolling', 'stopped', {});
-    // #endregion
   }
 }
 
@@ -260,23 +239,19 @@ function showImageModal(src, alt) {
   }
 
   async function loadImage(url) {
-    // same-origin; fetch -> blob avoids some caching/cors issues
-    const resp = await fetch(url);
-    if (!resp.ok) throw new Error(`下载图片失败: ${resp.status}`);
-    const blob = await resp.blob();
-    const objUrl = URL.createObjectURL(blob);
-    try {
-      const img = new Image();
-      img.decoding = 'async';
-      const p = new Promise((resolve, reject) => {
-        img.onload = () => resolve(img);
-        img.onerror = () => reject(new Error('图片解码失败'));
-      });
-      img.src = objUrl;
-      return await p;
-    } finally {
-      URL.revokeObjectURL(objUrl);
+    // same-origin, so the canvas is not tainted; loading by URL reuses the browser cache
+    // (the modal already shows the same versioned URL) instead of downloading a blob again
+    if (modalImg?.complete && modalImg.naturalWidth && modalImg.src === new URL(url, location.href).href) {
+      return modalImg;
     }
+    const img = new Image();
+    img.decoding = 'async';
+    const p = new Promise((resolve, reject) => {
+      img.onload = () => resolve(img);
+      img.onerror = () => reject(new Error('下载图片失败'));
+    });
+    img.src = url;
+    return await p;
   }
 
   function downloadBlob(blob, filename) {
@@ -337,9 +312,6 @@ function showImageModal(src, alt) {
         outW = Math.max(1, Math.round(outW * scale));
         outH = Math.max(1, Math.round(outH * scale));
 
-        // #region agent log
-        __dbg('I', 'frontend/app.js:showImageModal', 'export_clicked', { src, alt: safeAlt, fmt, q, outW, outH, scale });
-        // #endregion
 
         const canvas = document.createElement('canvas');
         canvas.width = outW;
@@ -371,9 +343,6 @@ function showImageModal(src, alt) {
   const btn = modal.querySelector('#downloadPdfBtn');
   if (btn) {
     btn.addEventListener('click', () => {
-      // #region agent log
-      __dbg('E', 'frontend/app.js:showImageModal', 'pdf_print_clicked', { src, alt });
-      // #endregion
 
       const w = window.open('', '_blank');
       if (!w) {
@@ -432,7 +401,8 @@ function renderOutputs(jobId, outputs) {
       wrapper.setAttribute('data-filename', item.name);
       
       const img = document.createElement('img');
-      img.src = item.url;
+      // 预览用缩略图（后端未安装 Pillow 时 thumb_url 为空，回退原图）；点击放大看原图
+      img.src = item.thumb_url || item.url;
       img.alt = item.name;
       img.loading = 'lazy';
       img.addEventListener('click', () => showImageModal(item.url, item.name));
@@ -454,20 +424,8 @@ function renderOutputs(jobId, outputs) {
 
 async function fetchStatus(jobId) {
   const resp = await fetch(`/api/jobs/${encodeURIComponent(jobId)}`);
-  // #region agent log
-  __dbg('B', 'frontend/app.js:fetchStatus', 'fetch_status_response', { jobId, ok: resp.ok, status: resp.status });
-  // #endregion
   if (!resp.ok) throw new Error(`查询失败: ${resp.status}`);
   const data = await resp.json();
-  // #region agent log
-  __dbg('B', 'frontend/app.js:fetchStatus', 'fetch_status_payload', {
-    jobId,
-    state: data?.state,
-    outputsCount: Array.isArray(data?.outputs) ? data.outputs.length : null,
-    outputsHasGseaCsv: Array.isArray(data?.outputs) ? data.outputs.some(o => o?.name === 'gsea_results.csv') : null,
-    outputsHasGseaCore: Array.isArray(data?.outputs) ? data.outputs.some(o => o?.name === 'gsea_core_genes.json') : null,
-  });
-  // #endregion
   return data;
 }
 
@@ -496,7 +454,13 @@ async function updateStatus(jobId) {
       if (hasDESeq2) {
         hints += '<li>前往 <a href="#/volcano" style="font-weight:bold;text-decoration:underline;">火山图页面</a> 生成增强版火山图（TopN 标注 + 自定义基因）</li>';
       }
-      hints += '</ul></div>';
+      hints += '</ul>';
+      if (st.extra?.gsea?.preliminary) {
+        hints += st.extra.gsea.refining
+          ? '<div>⏳ 当前 GSEA 结果为预览（粗略置换 p 值），精确结果计算完成后会自动替换。</div>'
+          : '<div>⚠️ GSEA 精算失败，当前仍为预览结果（粗略置换 p 值）。</div>';
+      }
+      hints += '</div>';
       nextStepsEl.innerHTML = hints;
     }
   } else if (nextStepsEl) {
@@ -504,7 +468,9 @@ async function updateStatus(jobId) {
   }
 
   const jobState = st.state;
-  if (jobState === 'success' || jobState === 'error') {
+  // GSEA 预览结果发布后 job 即为 success，精算完成前继续轮询
+  const refining = jobState === 'success' && st.extra?.gsea?.refining;
+  if ((jobState === 'success' && !refining) || jobState === 'error') {
     if (pollTimer) {
       clearInterval(pollTimer);
       pollTimer = null;
@@ -604,11 +570,39 @@ function renderSubmitView() {
           <label class="check"><input type="checkbox" name="run_pca" checked /> 运行 PCA</label>
           <label class="check"><input type="checkbox" name="run_deseq2" checked /> 运行 DESeq2</label>
           <label class="check"><input type="checkbox" name="run_gsea" checked /> 运行 GSEA</label>
+          <label class="check"><input type="checkbox" name="gsea_progressive" checked /> GSEA 先出预览结果</label>
           <label class="check"><input type="checkbox" name="run_gsva" /> 运行 GSVA</label>
           <label class="check"><input type="checkbox" name="run_tf" /> 运行 TF(decoupleR)</label>
           <label class="check"><input type="checkbox" name="run_heatmap" /> 生成热图（自定义/TopDEG）</label>
         </div>
 
+        <div class="row">
+          <label>
+            <span>TF 网络</span>
+            <select name="tf_database">
+              <option value="collectri" selected>CollecTRI</option>
+              <option value="dorothea">DoRothEA</option>
+            </select>
+          </label>
+          <label>
+            <span>TF 方法</span>
+            <select name="tf_method">
+              <option value="ulm" selected>ulm</option>
+              <option value="wmean">wmean</option>
+              <option value="viper">viper</option>
+            </select>
+          </label>
+          <label>
+            <span>DoRothEA 置信度</span>
+            <select name="tf_dorothea_levels">
+              <option value="A">A</option>
+              <option value="A,B">A,B</option>
+              <option value="A,B,C" selected>A,B,C</option>
+              <option value="A,B,C,D">A,B,C,D</option>
+            </select>
+          </label>
+        </div>
+
         <label>
           <span>热图基因（可选，每行一个；为空则使用 Top DEGs）</span>
           <textarea name="heatmap_genes" rows="5" placeholder="TP53\nBRCA1\nEGFR"></textarea>
@@ -700,7 +694,7 @@ function renderSubmitView() {
     e.preventDefault();
     const form = e.target;
     const fd = new FormData(form);
-    for (const name of ['run_pca','run_deseq2','run_gsea','run_gsva','run_tf','run_heatmap']) {
+    for (const name of ['run_pca','run_deseq2','run_gsea','gsea_progressive','run_gsva','run_tf','run_heatmap']) {
       fd.set(name, form.querySelector(`input[name="${name}"]`).checked ? 'true' : 'false');
     }
     $('#submitBtn').disabled = true;
@@ -714,7 +708,8 @@ function renderSubmitView() {
       state.workflowStep = 1;
       saveState();
       // 显示成功提示
-      if (confirm(`✓ 任务已提交！\n\nJob ID: ${jobId}\n\n点击"确定"查看任务状态和结果`)) {
+      const warnText = (data.warnings || []).length ? `\n\n⚠️ ${data.warnings.join('\n⚠️ ')}` : '';
+      if (confirm(`✓ 任务已提交！\n\nJob ID: ${jobId}${warnText}\n\n点击"确定"查看任务状态和结果`)) {
         window.location.hash = '#/jobs';
       }
     } catch (err) {
@@ -775,14 +770,6 @@ function renderJobsView() {
 async function loadGseaCore(jobId) {
   const st = await fetchStatus(jobId);
   const item = (st.outputs || []).find(o => o.name === 'gsea_core_genes.json');
-  // #region agent log
-  __dbg('C', 'frontend/app.js:loadGseaCore', 'resolve_core_item', {
-    jobId,
-    outputsCount: Array.isArray(st.outputs) ? st.outputs.length : null,
-    found: !!item,
-    url: item?.url || null,
-  });
-  // #endregion
   if (!item) throw new Error('该 job 没有 gsea_core_genes.json（请确保主任务运行了 GSEA 且成功）');
   const resp = await fetch(item.url);
   if (!resp.ok) throw new Error('无法下载 gsea_core_genes.json');
@@ -801,6 +788,20 @@ async function checkJobOutput(jobId, filename) {
   }
 }
 
+// 输出图片的地址：列表中的 url 带内容哈希（?v=），浏览器可长期缓存，内容变化后地址随之变化。
+// 面板中显示原图（缩略图只用于输出列表）；不在列表中时用不带版本的地址，由 ETag 协商缓存。
+async function outputImageUrl(jobId, filename, st = null) {
+  const plain = `/api/jobs/${encodeURIComponent(jobId)}/outputs/${encodeURIComponent(filename)}`;
+  try {
+    const status = st || await fetchStatus(jobId);
+    const item = (status.outputs || []).find(o => o.name === filename);
+    if (item) return item.url;
+  } catch (e) {
+    // 查询失败时仍可用普通地址
+  }
+  return plain;
+}
+
 // 显示文件检查状态
 function updateFileCheckStatus(elementId, hasFile, filename) {
   const el = $(elementId);
@@ -815,9 +816,6 @@ function updateFileCheckStatus(elementId, hasFile, filename) {
 }
 
 function renderGseaView() {
-  // #region agent log
-  __dbg('A', 'frontend/app.js:renderGseaView', 'enter', { stateJobId: state.jobId || '', hash: window.location.hash || '' });
-  // #endregion
   $('#view').innerHTML = `
     <div class="card">
       <h2>GSEA：通路富集结果</h2>
@@ -854,9 +852,6 @@ function renderGseaView() {
     if (gseaWaitTimer) {
       clearInterval(gseaWaitTimer);
       gseaWaitTimer = null;
-      // #region agent log
-      __dbg('F', 'frontend/app.js:renderGseaView', 'wait_stopped', {});
-      // #endregion
     }
   }
 
@@ -865,9 +860,6 @@ function renderGseaView() {
     if (!jobId) return;
     $('#gseaFileCheckStatus').textContent = '⏳ 正在等待 GSEA 输出文件生成（会自动刷新）...';
     $('#gseaFileCheckStatus').className = 'text-info';
-    // #region agent log
-    __dbg('F', 'frontend/app.js:renderGseaView', 'wait_started', { jobId });
-    // #endregion
     let tries = 0;
     gseaWaitTimer = setInterval(async () => {
       tries += 1;
@@ -875,17 +867,11 @@ function renderGseaView() {
         const st = await fetchStatus(jobId);
         const hasGseaResults = Array.isArray(st.outputs) ? st.outputs.some(o => o?.name === 'gsea_results.csv') : false;
         const hasCoreGenes = Array.isArray(st.outputs) ? st.outputs.some(o => o?.name === 'gsea_core_genes.json') : false;
-        // #region agent log
-        __dbg('F', 'frontend/app.js:renderGseaView/wait', 'tick', { jobId, tries, state: st?.state, hasGseaResults, hasCoreGenes });
-        // #endregion
         if (hasGseaResults && hasCoreGenes) {
           stopGseaWait();
           if (!gseaAutoLoaded) {
             gseaAutoLoaded = true;
             loadAndRender().catch(err => {
-              // #region agent log
-              __dbg('D', 'frontend/app.js:renderGseaView/wait', 'auto_load_failed', { message: err?.message || String(err) });
-              // #endregion
               console.error(err);
             });
           }
@@ -896,9 +882,6 @@ function renderGseaView() {
           if (tries > 300) stopGseaWait();
         }
       } catch (e) {
-        // #region agent log
-        __dbg('F', 'frontend/app.js:renderGseaView/wait', 'tick_failed', { jobId, tries, message: e?.message || String(e) });
-        // #endregion
         if (tries > 20) stopGseaWait();
       }
     }, 2000);
@@ -914,9 +897,6 @@ function renderGseaView() {
     }
     const hasGseaResults = await checkJobOutput(jobId, 'gsea_results.csv');
     const hasCoreGenes = await checkJobOutput(jobId, 'gsea_core_genes.json');
-    // #region agent log
-    __dbg('B', 'frontend/app.js:renderGseaView/checkGseaFiles', 'check_files', { jobId, hasGseaResults, hasCoreGenes });
-    // #endregion
     if (hasGseaResults && hasCoreGenes) {
       updateFileCheckStatus('gseaFileCheckStatus', true, 'gsea_results.csv 和 gsea_core_genes.json');
       stopGseaWait();
@@ -951,9 +931,6 @@ function renderGseaView() {
       alert('请输入 Job ID');
       return;
     }
-    // #region agent log
-    __dbg('A', 'frontend/app.js:renderGseaView/loadAndRender', 'start', { jobId });
-    // #endregion
     
     // 先检查文件
     const hasFiles = await checkGseaFiles();
@@ -964,13 +941,6 @@ function renderGseaView() {
 
     setCurrentJobId(jobId);
     const core = await loadGseaCore(jobId);
-    // #region agent log
-    __dbg('D', 'frontend/app.js:renderGseaView/loadAndRender', 'core_loaded', {
-      jobId,
-      coreLen: Array.isArray(core) ? core.length : null,
-      firstKeys: Array.isArray(core) && core[0] ? Object.keys(core[0]) : null,
-    });
-    // #endregion
     // render simple table
     const rows = core.map((r, idx) => `
       <tr data-idx="${idx}" style="cursor: pointer;">
@@ -1059,7 +1029,7 @@ function renderGseaView() {
         const outName = act.output || '';
         $('#gseaSingleStatus').innerHTML = `<p class="text-success">${act.message || '单通路图生成完成'}</p>`;
         if (outName) {
-          const url = `/api/jobs/${encodeURIComponent(jobId)}/outputs/${encodeURIComponent(outName)}?t=${Date.now()}`;
+          const url = await outputImageUrl(jobId, outName, st);
           const img = document.createElement('img');
           img.src = url;
           img.alt = 'GSEA single pathway';
@@ -1088,8 +1058,8 @@ function renderGseaView() {
   let gseaPlotsInitialized = false;
 
   // 显示 GSEA 图片（dotplot 或 barplot）
-  function showGseaPlot(jobId, plotType) {
-    const url = `/api/jobs/${encodeURIComponent(jobId)}/outputs/gsea_${plotType}.png?t=${Date.now()}`;
+  async function showGseaPlot(jobId, plotType) {
+    const url = await outputImageUrl(jobId, `gsea_${plotType}.png`);
     const img = document.createElement('img');
     img.src = url;
     img.alt = `GSEA ${plotType}`;
@@ -1134,7 +1104,7 @@ function renderGseaView() {
       const st = await fetchStatus(jobId);
       const act = st.extra?.gsea_single_plot;
       if (act?.state === 'success' && act?.output) {
-        const url = `/api/jobs/${encodeURIComponent(jobId)}/outputs/${encodeURIComponent(act.output)}?t=${Date.now()}`;
+        const url = await outputImageUrl(jobId, act.output, st);
         const img = document.createElement('img');
         img.src = url;
         img.alt = 'GSEA single pathway';
@@ -1165,31 +1135,79 @@ function renderGseaView() {
     
     // 然后检查并加载通路表格
     setTimeout(() => {
-      // #region agent log
-      __dbg('A', 'frontend/app.js:renderGseaView', 'auto_load_timer_fired', {
-        stateJobId: state.jobId || '',
-        inputJobId: $('#jobIdInput')?.value?.trim?.() || '',
-      });
-      // #endregion
       checkGseaFiles().then(hasFiles => {
         if (hasFiles) {
           loadAndRender().catch(err => {
-            // #region agent log
-            __dbg('D', 'frontend/app.js:renderGseaView', 'auto_load_failed', { message: err?.message || String(err) });
-            // #endregion
             console.error(err);
           });
         }
       }).catch(err => {
-        // #region agent log
-        __dbg('D', 'frontend/app.js:renderGseaView', 'checkGseaFiles_failed', { message: err?.message || String(err) });
-        // #endregion
         console.error(err);
       });
     }, 100);
   }
 }
 
+// 在浏览器中绘制 /heatmap_data 返回的 Z-score 矩阵（蓝-白-红，截断在 ±2，与 plot_heatmap_png 一致）
+function drawHeatmapCanvas(container, data, order) {
+  const nRow = data.genes.length;
+  const nCol = data.samples.length;
+  let rows = [...Array(nRow).keys()];
+  let cols = [...Array(nCol).keys()];
+  if (order === 'cluster') {
+    rows = data.row_order;
+    cols = data.col_order;
+  } else if (order === 'name') {
+    rows.sort((a, b) => data.genes[a].localeCompare(data.genes[b]));
+  }
+
+  const cell = Math.max(4, Math.min(24, Math.floor(900 / Math.max(nCol, 1))));
+  const rowH = Math.max(4, Math.min(18, Math.floor(900 / Math.max(nRow, 1))));
+  const labelW = 110;
+  const labelH = 90;
+  const canvas = document.createElement('canvas');
+  canvas.width = labelW + cell * nCol;
+  canvas.height = labelH + rowH * nRow;
+  canvas.style.maxWidth = '100%';
+  const ctx = canvas.getContext('2d');
+  ctx.fillStyle = '#fff';
+  ctx.fillRect(0, 0, canvas.width, canvas.height);
+
+  const mix = (a, b, t) => Math.round(a + (b - a) * t);
+  const color = (z) => {
+    const t = Math.max(-2, Math.min(2, z)) / 2;
+    const [lo, mid, hi] = [[0x21, 0x66, 0xAC], [0xF7, 0xF7, 0xF7], [0xB2, 0x18, 0x2B]];
+    const [from, to, f] = t < 0 ? [mid, lo, -t] : [mid, hi, t];
+    return `rgb(${mix(from[0], to[0], f)},${mix(from[1], to[1], f)},${mix(from[2], to[2], f)})`;
+  };
+
+  rows.forEach((r, i) => {
+    cols.forEach((c, j) => {
+      ctx.fillStyle = color(data.values[r][c]);
+      ctx.fillRect(labelW + j * cell, labelH + i * rowH, cell, rowH);
+    });
+  });
+
+  ctx.fillStyle = '#333';
+  ctx.font = `${Math.min(12, rowH)}px sans-serif`;
+  ctx.textBaseline = 'middle';
+  if (rowH >= 8) {
+    rows.forEach((r, i) => ctx.fillText(data.genes[r], 4, labelH + i * rowH + rowH / 2, labelW - 8));
+  }
+  if (cell >= 8) {
+    cols.forEach((c, j) => {
+      ctx.save();
+      ctx.translate(labelW + j * cell + cell / 2, labelH - 4);
+      ctx.rotate(-Math.PI / 2);
+      ctx.fillText(data.samples[c], 0, 0, labelH - 8);
+      ctx.restore();
+    });
+  }
+
+  container.innerHTML = '';
+  container.appendChild(canvas);
+}
+
 function renderHeatmapView() {
   $('#view').innerHTML = `
     <div class="card">
@@ -1205,12 +1223,52 @@ function renderHeatmapView() {
       <div id="heatmapSelectedPathway" style="margin: 0.5rem 0;"></div>
       <div class="row">
         <button id="generateHeatmap" class="button">生成热图</button>
+        <button id="quickHeatmap" class="secondary">快速预览（浏览器绘制）</button>
+        <label>
+          <span>排序</span>
+          <select id="heatmapOrder">
+            <option value="cluster">聚类顺序</option>
+            <option value="original">原始顺序</option>
+            <option value="name">按基因名</option>
+          </select>
+        </label>
       </div>
       <div id="heatmapStatus" style="margin: 0.5rem 0;"></div>
       <h3>热图预览</h3>
       <div id="heatmapPreview" style="margin-top: 1rem;"></div>
     </div>
   `;
+
+  let heatmapData = null;
+
+  $('#quickHeatmap').addEventListener('click', async () => {
+    const jobId = $('#heatmapJobId').value.trim();
+    if (!jobId) {
+      alert('请输入 Job ID');
+      return;
+    }
+    if (!state.selectedPathway) {
+      alert('请先到 GSEA 页面选择一个通路');
+      return;
+    }
+    const qs = new URLSearchParams();
+    if (state.selectedPathway.ID) qs.set('pathway_id', state.selectedPathway.ID);
+    if (state.selectedPathway.Description) qs.set('pathway_description', state.selectedPathway.Description);
+    try {
+      const resp = await fetch(`/api/jobs/${encodeURIComponent(jobId)}/heatmap_data?${qs}`);
+      const data = await resp.json();
+      if (!resp.ok) throw new Error(data.detail || '加载失败');
+      heatmapData = data;
+      $('#heatmapStatus').innerHTML = `<p class="text-success">✓ ${data.genes.length} 个基因 × ${data.samples.length} 个样本</p>`;
+      drawHeatmapCanvas($('#heatmapPreview'), heatmapData, $('#heatmapOrder').value);
+    } catch (e) {
+      $('#heatmapStatus').innerHTML = `<p class="text-danger">错误：${e.message || String(e)}</p>`;
+    }
+  });
+
+  $('#heatmapOrder').addEventListener('change', () => {
+    if (heatmapData) drawHeatmapCanvas($('#heatmapPreview'), heatmapData, $('#heatmapOrder').value);
+  });
   
   if (state.jobId) $('#heatmapJobId').value = state.jobId;
   
@@ -1237,7 +1295,7 @@ function renderHeatmapView() {
     
     const hasHeatmap = await checkJobOutput(jobId, 'heatmap.png');
     if (hasHeatmap) {
-      const imgUrl = `/api/jobs/${encodeURIComponent(jobId)}/outputs/heatmap.png?t=${Date.now()}`;
+      const imgUrl = await outputImageUrl(jobId, 'heatmap.png');
       const img = document.createElement('img');
       img.src = imgUrl;
       img.alt = 'Heatmap';
@@ -1314,7 +1372,7 @@ function renderHeatmapView() {
         if (hm && hm.state === 'success') {
           $('#heatmapStatus').innerHTML = `<p class="text-success">${hm.message || '热图生成成功'}</p>`;
           // 显示预览
-          const imgUrl = `/api/jobs/${encodeURIComponent(jobId)}/outputs/heatmap.png?t=${Date.now()}`;
+          const imgUrl = await outputImageUrl(jobId, 'heatmap.png', st);
           const img = document.createElement('img');
           img.src = imgUrl;
           img.alt = 'Heatmap';
@@ -1391,7 +1449,7 @@ function renderVolcanoView() {
     }
     
     if (imgName) {
-      const imgUrl = `/api/jobs/${encodeURIComponent(jobId)}/outputs/${imgName}?t=${Date.now()}`;
+      const imgUrl = await outputImageUrl(jobId, imgName);
       const img = document.createElement('img');
       img.src = imgUrl;
       img.alt = 'Volcano plot';
@@ -1496,7 +1554,7 @@ function renderVolcanoView() {
         const act = st.extra?.volcano_inplace;
         if (act?.state === 'success') {
           $('#volcanoInplaceStatus').innerHTML = `<p class="text-success">${act.message || '火山图生成完成'}（输出已写入同一 job）</p>`;
-          const imgUrl = `/api/jobs/${encodeURIComponent(jobId)}/outputs/volcano_custom.png?t=${Date.now()}`;
+          const imgUrl = await outputImageUrl(jobId, 'volcano_custom.png', st);
           const img = document.createElement('img');
           img.src = imgUrl;
           img.alt = 'Volcano custom';